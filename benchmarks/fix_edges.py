@@ -0,0 +1,124 @@
+"""Resolving the imports of every file to graph edges with the list scans fix_edges used
+versus the FileIndex of python_components.networkx_graphing, on the repositories in
+analyzed_repos/ and on generated repositories of up to 10k files.
+
+run from the repository root with `python benchmarks/fix_edges.py`
+"""
+import random
+import sys
+from copy import deepcopy
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from python_components.networkx_graphing import fix_edges  # noqa: E402
+from python_components.repo_store import RepoStore  # noqa: E402
+
+REPO_STORE = RepoStore('analyzed_repos')
+
+
+def list_fix_edges(
+    graph_nodes: list[dict],
+) -> tuple[list[dict], tuple[str, str, float], list[str]]:
+    """Previous behaviour, deleting from the imports while enumerating them skips some"""
+    edge_weight = 5.0
+    file_names = [n['id'] for n in graph_nodes]
+    graph_edges = []
+    for graph_node in graph_nodes:
+        for i, package in enumerate(graph_node['imports']):
+            del graph_node['imports'][i]
+            if package in file_names:
+                graph_node['imports'].append(package)
+                graph_edges.append((package, graph_node['id'], edge_weight))
+            else:
+                split_package = package.split('/')
+                subpackage = "/".join(list(split_package[:-1]))
+                base_package = split_package[0]
+                if '*' in package:
+                    for file_name in file_names:
+                        if subpackage in file_name:
+                            graph_node['imports'].append(file_name)
+                            graph_edges.append((file_name, graph_node['id'], edge_weight))
+                elif subpackage in file_names:
+                    graph_node['imports'].append(subpackage)
+                    graph_edges.append((subpackage, graph_node['id'], edge_weight))
+                else:
+                    graph_node['imports'].append(base_package)
+                    graph_edges.append((base_package, graph_node['id'], 1.0))
+    return graph_nodes, graph_edges, file_names
+
+
+def each_import_once(graph_nodes: list[dict]) -> list[dict]:
+    """the nodes with every import listed twice, so the previous behaviour sees each of them"""
+    return [
+        {**node, 'imports': [package for package in node['imports'] for _ in range(2)]}
+        for node in graph_nodes
+    ]
+
+
+def generated_nodes(files: int, imports: int = 10, seed: int = 0) -> list[dict]:
+    """a repository of files in nested packages importing files, their names and externals"""
+    rng = random.Random(seed)
+    file_names = [
+        f'package_{i % 10}/module_{i % 7}/file_{i}' if i % 3 else f'package_{i % 10}/file_{i}'
+        for i in range(files)
+    ]
+    nodes = []
+    for file_name in file_names:
+        packages = []
+        for _ in range(imports):
+            imported = rng.choice(file_names)
+            packages.append(
+                rng.choice(
+                    [
+                        imported,
+                        f'{imported}/function',
+                        f'{imported}/*',
+                        f'external_{rng.randrange(50)}/module',
+                    ]
+                )
+            )
+        nodes.append({'id': file_name, 'imports': packages})
+    return nodes
+
+
+def edge_set(resolve, graph_nodes: list[dict]) -> set[tuple[str, str, float]]:
+    return set(resolve(deepcopy(graph_nodes))[1])
+
+
+def timed(resolve, graph_nodes: list[dict], repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        copied_nodes = deepcopy(graph_nodes)
+        start = perf_counter()
+        resolve(copied_nodes)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    for repository in REPO_STORE.repositories():
+        nodes = REPO_STORE.nodes(repository)
+        edges = edge_set(fix_edges, nodes)
+        before = timed(list_fix_edges, nodes)
+        after = timed(fix_edges, nodes)
+        print(
+            f'{repository}: {len(nodes)} files, {len(edges)} edges, '
+            f'previous edges {len(edge_set(list_fix_edges, nodes))}, identical when every '
+            f'import is seen {edge_set(list_fix_edges, each_import_once(nodes)) == edges}, '
+            f'list {before * 1000:.2f}ms, index {after * 1000:.2f}ms, {before / after:.1f}x'
+        )
+    for files in (1000, 2500, 10000):
+        nodes = generated_nodes(files)
+        edges = len(fix_edges(nodes)[1])
+        after = timed(fix_edges, nodes)
+        before = timed(list_fix_edges, nodes, repeat=1)
+        print(
+            f'{files} generated files: {edges} edges, list {before:.2f}s, '
+            f'index {after:.2f}s, {before / after:.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Building the import graph and the view of only the files for every repository in
+analyzed_repos/, deep copying the graph for the view versus keeping node payloads out of
+band, with the code and llm responses in the node records as main.py used to load them.
+
+run from the repository root with `python benchmarks/get_graphs.py`
+"""
+import sys
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+from time import perf_counter
+
+import networkx as nx
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from python_components.networkx_graphing import (  # noqa: E402
+    fix_edges,
+    get_graphs,
+    without_keys,
+)
+from python_components.repo_store import RepoStore  # noqa: E402
+
+REPO_STORE = RepoStore('analyzed_repos')
+
+
+def deepcopy_get_graphs(edge_property_list: list[dict]) -> tuple[nx.Graph, nx.Graph]:
+    """Previous behaviour, the view of the files is taken from a deep copy of the graph"""
+    nodes, edges, files = fix_edges(edge_property_list)
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from(edges)
+    file_set = set(files)
+    for node in graph:
+        if node not in file_set:
+            graph.nodes[node]['color'] = '#ced7d8'
+            graph.nodes[node]['shape'] = 'box'
+            graph.nodes[node]['type'] = 'external'
+    for node in nodes:
+        graph.add_node(node['id'], **without_keys(node, {'id'}))
+    return graph, deepcopy(graph).subgraph(files)
+
+
+def full_nodes(repository: str) -> list[dict]:
+    """node records with their code and llm responses put back in"""
+    nodes = REPO_STORE.nodes(repository)
+    fields = REPO_STORE.fields(repository)
+    for node in nodes:
+        node['code'] = REPO_STORE.code(repository, node['id'])
+        for category in fields[node['id']].get('responses', {}):
+            node[category]['response'] = REPO_STORE.response(repository, node['id'], category)
+    return nodes
+
+
+def measured(build_graphs, nodes: list[dict], repeat: int = 5) -> tuple[float, int]:
+    """the best time and the peak memory allocated while building the graphs"""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        build_graphs(nodes)
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    build_graphs(nodes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main() -> None:
+    for repository in REPO_STORE.repositories():
+        nodes = full_nodes(repository)
+        before, before_peak = measured(deepcopy_get_graphs, nodes)
+        after, after_peak = measured(get_graphs, nodes)
+        print(
+            f'{repository}: {len(nodes)} files, deepcopy {before * 1000:.2f}ms '
+            f'{before_peak / 1024:.0f}KiB, payloads {after * 1000:.2f}ms '
+            f'{after_peak / 1024:.0f}KiB, {before / after:.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
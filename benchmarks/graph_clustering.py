@@ -0,0 +1,56 @@
+"""Sending the whole function call graph of a directory to the browser versus the clustered
+first view of src.graph_clustering for a few node budgets, comparing nodes and payload size.
+
+run from the repository root with `python benchmarks/graph_clustering.py [directory] [max_depth]`
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from graph_clustering import ClusterTree, cluster_id  # noqa: E402
+from graphing import build_graphs_for_project  # noqa: E402
+from vis_payload import dumps, vis_data  # noqa: E402
+
+NODE_BUDGETS = (100, 500, 2000)
+
+
+def main() -> None:
+    directory = Path(sys.argv[1] if len(sys.argv) > 1 else '.')
+    max_depth = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    _, function_call_graph = build_graphs_for_project(
+        local_project_dir=directory, max_depth=max_depth, parse_cache=None
+    )
+    start = perf_counter()
+    payload = dumps(vis_data(function_call_graph))
+    print(
+        f'whole graph: {function_call_graph.number_of_nodes()} nodes, '
+        f'{function_call_graph.number_of_edges()} edges, {len(payload) / 1024:.0f}KiB, '
+        f'{(perf_counter() - start) * 1000:.1f}ms'
+    )
+    start = perf_counter()
+    clusters = ClusterTree(function_call_graph)
+    print(f'cluster tree: {(perf_counter() - start) * 1000:.1f}ms')
+    for node_budget in NODE_BUDGETS:
+        start = perf_counter()
+        view = clusters.vis_data(clusters.level_of_detail(node_budget))
+        payload = dumps(view)
+        print(
+            f'budget {node_budget}: {len(view["nodes"])} nodes, {len(view["edges"])} edges, '
+            f'{len(payload) / 1024:.0f}KiB, {(perf_counter() - start) * 1000:.1f}ms'
+        )
+    # The largest top level cluster, usually the calls to functions defined elsewhere
+    largest = cluster_id(clusters.children(())[0])
+    start = perf_counter()
+    children = clusters.expand(largest, NODE_BUDGETS[1])
+    print(
+        f'expanding {largest}: {len(children["nodes"])} nodes, '
+        f'{len(children["edges"])} edges, {children["more"]} more, '
+        f'{(perf_counter() - start) * 1000:.1f}ms'
+    )
+    print(f'cluster tree size estimate: {clusters.size / 1024:.0f}KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Finding the imports of every file in analyzed_repos/ with the regex pipeline main.py used
+versus the single pass python_components.import_scanner, checking both against the imports
+ast finds.
+
+run from the repository root with `python benchmarks/import_scanner.py`
+"""
+import ast
+import re
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from python_components.import_scanner import (  # noqa: E402
+    file_imports,
+    package_paths,
+    relative_root,
+)
+from python_components.old_types import Package  # noqa: E402
+from python_components.repo_store import RepoStore  # noqa: E402
+
+REPO_STORE = RepoStore('analyzed_repos')
+
+
+# Previous behaviour, copied from main.py
+def extract_and_remove_pattern(pattern, code):
+    return pattern.findall(code), pattern.sub('\n', code)
+
+
+def clean_code(code: str) -> str:
+    code = re.sub(re.compile('#.*?\n'), '', code)
+    code = re.sub(re.compile(re.compile(r'""".*?"""', re.DOTALL)), '', code)
+    code = re.sub(re.compile(r'".*?"'), '', code)
+    return re.sub(re.compile(r"'.*?'"), '', code)
+
+
+def import_line_to_packages(import_line: str) -> Package:
+    clean_line = re.sub(r'as\s+\S+', '', import_line).replace('.', '/')
+    for symbol in ['\n', '(', ')', ',', 'import']:
+        clean_line = clean_line.replace(symbol, '')
+    packages = clean_line.split()
+    return Package(packages[0], packages[1:])
+
+
+def packages_from_line(line: str, file_name: str) -> list[str]:
+    package = import_line_to_packages(line)
+    stripped_root = package.root.lstrip('/')
+    difference = len(package.root) - len(stripped_root)
+    if difference > 0:
+        root_folder = "/".join(list(file_name.split('/')[:-difference]))
+        package.root = f'{root_folder}{stripped_root}'
+    if package.packages:
+        return [f'{package.root}/{imported_package}' for imported_package in package.packages]
+    return [f'{package.root}']
+
+
+def regex_imports(file_content: str, file_path: str) -> list[str]:
+    code = clean_code(file_content)
+    from_with_braces = re.compile(r'from\s+(.+\s+import\s+\((?:.|\n)+?\))')
+    from_with_braces, new_code = extract_and_remove_pattern(from_with_braces, code)
+    from_import, new_code = extract_and_remove_pattern(re.compile(r'from\s+(.+)'), new_code)
+    imports, new_code = extract_and_remove_pattern(re.compile(r'import\s+(.+)'), new_code)
+    packages = []
+    for line in from_with_braces + from_import + imports:
+        packages += packages_from_line(line, file_path)
+    return packages
+
+
+def ast_imports(file_content: str, file_path: str) -> list[str]:
+    packages = []
+    for node in ast.walk(ast.parse(file_content)):
+        if isinstance(node, ast.Import):
+            packages += [Package(alias.name.replace('.', '/'), []) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            root = (node.module or '').replace('.', '/')
+            if node.level:
+                root = relative_root(node.level, root, file_path)
+            names = [alias.name.replace('.', '/') for alias in node.names]
+            packages.append(Package(root, names))
+    return package_paths(packages)
+
+
+def best_time(find_imports, files: list[tuple[str, str]], repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for file_path, code in files:
+            find_imports(code, file_path)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    for repository in REPO_STORE.repositories():
+        files = [
+            (node['id'], REPO_STORE.code(repository, node['id']))
+            for node in REPO_STORE.nodes(repository)
+        ]
+        expected = [sorted(ast_imports(code, file_path)) for file_path, code in files]
+        regex_errors, scanner_errors = (
+            sum(
+                sorted(find_imports(code, file_path)) != imports
+                for (file_path, code), imports in zip(files, expected)
+            )
+            for find_imports in (regex_imports, file_imports)
+        )
+        before = best_time(regex_imports, files)
+        after = best_time(file_imports, files)
+        print(
+            f'{repository}: {len(files)} files, differing from ast: regex {regex_errors} '
+            f'scanner {scanner_errors}, regex {before * 1000:.2f}ms, '
+            f'scanner {after * 1000:.2f}ms, {before / after:.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
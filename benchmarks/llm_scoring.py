@@ -0,0 +1,102 @@
+"""Scoring every python file of a directory with four prompts against a local fake completion
+server through python_components.scoring, one request at a time versus concurrently.
+
+run from the repository root with `python benchmarks/llm_scoring.py [directory] [mode]`
+"""
+import asyncio
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from python_components.scoring import ScoringSettings, score_files  # noqa: E402
+
+LATENCY = 0.5
+THROTTLE_RATE = 0.05
+MALFORMED_RATE = 0.05
+PROMPTS = {
+    category: f'Review the {category.lower()} of this code:\n{{Code}}'
+    for category in ('Predictability', 'Readability', 'Scalability', 'Testability')
+}
+
+fake_server = FastAPI()
+completions_served = 0
+
+
+def combined_answer(prompt: str) -> str:
+    """a json answer for every numbered file and criterion of a combined prompt"""
+    criteria = re.findall(r'^- (\w+):', prompt, re.MULTILINE)
+    numbers = re.findall(r'^File (\d+):$', prompt, re.MULTILINE)
+    answer = {
+        number: {
+            criterion: {'review': 'Looks fine.', 'score': random.randint(1, 10)}
+            for criterion in criteria
+        }
+        for number in numbers
+    }
+    return json.dumps(answer)[: -1 if random.random() < MALFORMED_RATE else None]
+
+
+@fake_server.post('/v1/completions')
+async def completions(request: Request):
+    """answers after LATENCY seconds and throttles a share of requests like the real api"""
+    global completions_served
+    prompt = (await request.json())['prompt']
+    if random.random() < THROTTLE_RATE:
+        return JSONResponse({'error': 'rate limited'}, status_code=429)
+    await asyncio.sleep(LATENCY)
+    completions_served += 1
+    if prompt.endswith('JSON:'):
+        text = combined_answer(prompt)
+    elif prompt.endswith('1 to 10:'):
+        text = str(random.randint(1, 10))
+    else:
+        text = 'Looks fine.'
+    return {'choices': [{'text': text}]}
+
+
+def serve(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(fake_server, port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def timed(files: list[tuple[str, str]], settings: ScoringSettings) -> tuple[float, dict]:
+    start = time.perf_counter()
+    reviews = score_files(files, PROMPTS, settings)
+    return time.perf_counter() - start, reviews
+
+
+def main() -> None:
+    global completions_served
+    directory = Path(sys.argv[1] if len(sys.argv) > 1 else '.')
+    mode = sys.argv[2] if len(sys.argv) > 2 else 'separate'
+    files = [(str(path), path.read_text()) for path in directory.glob('**/*.py')]
+    server = serve(8765)
+    settings = ScoringSettings(base_url='http://127.0.0.1:8765/v1', backoff=0.1, mode=mode)
+    serial, _ = timed(files, replace(settings, concurrency=1))
+    completions_served = 0
+    elapsed, reviews = timed(files, settings)
+    failed = sum(isinstance(review, Exception) for review in reviews.values())
+    print(
+        f'{mode}: {len(files)} files, {len(reviews)} reviews, {failed} failed, '
+        f'{completions_served} completions, serial {serial:.1f}s, '
+        f'concurrent {elapsed:.1f}s, {serial / elapsed:.1f}x'
+    )
+    server.should_exit = True
+
+
+if __name__ == '__main__':
+    main()
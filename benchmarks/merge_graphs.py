@@ -0,0 +1,67 @@
+"""Building the function call graph of the repositories in analyzed_repos/ by composing the
+local call graphs of their files one by one versus graphing.build_function_call_graph.
+
+run from the repository root with `python benchmarks/merge_graphs.py`
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import networkx as nx
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from graphing import build_function_call_graph, parse_file  # noqa: E402
+from python_components.repo_store import RepoStore  # noqa: E402
+
+REPO_STORE = RepoStore('analyzed_repos')
+
+
+def parsed_files(repository: str) -> dict:
+    files = {}
+    for node in REPO_STORE.nodes(repository):
+        try:
+            files[node['id']] = parse_file(
+                Path(node['id'] + '.py'),
+                file_bytes=REPO_STORE.code(repository, node['id']).encode('utf-8'),
+                module_name=node['id'].replace('/', '.'),
+            )
+        except UnicodeDecodeError:
+            continue
+    return files
+
+
+def compose_graphs(parsed_files: dict) -> nx.DiGraph:
+    """Previous behaviour, every compose copies the graph merged so far"""
+    merged_graph = nx.DiGraph()
+    for parsed_file in parsed_files.values():
+        merged_graph = nx.compose(merged_graph, parsed_file.local_call_graph)
+    return merged_graph
+
+
+def best_time(build, files: dict, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        build(files)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    for repository in REPO_STORE.repositories():
+        files = parsed_files(repository)
+        graph = build_function_call_graph(files)
+        assert nx.utils.graphs_equal(graph, compose_graphs(files))
+        before = best_time(compose_graphs, files)
+        after = best_time(build_function_call_graph, files)
+        print(
+            f'{repository}: {len(files)} files, {graph.number_of_nodes()} nodes, '
+            f'{graph.number_of_edges()} edges, compose {before * 1000:.2f}ms, '
+            f'build {after * 1000:.2f}ms, {before / after:.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
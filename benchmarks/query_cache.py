@@ -0,0 +1,54 @@
+"""Per-file cost of compiling tree-sitter queries on every call versus once per language.
+
+run from the repository root with `python benchmarks/query_cache.py [directory]`
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from custom_language_parsers import LANGUAGES  # noqa: E402
+
+
+def source_files(directory: Path) -> list[tuple[object, bytes]]:
+    return [
+        (LANGUAGES[filepath.suffix[1:]], filepath.read_bytes())
+        for filepath in directory.glob('**/*')
+        if filepath.is_file() and filepath.suffix[1:] in LANGUAGES
+    ]
+
+
+def time_per_file(parsed_files: list, captures_for_file) -> float:
+    start = perf_counter()
+    for parser, root_node in parsed_files:
+        captures_for_file(parser, root_node)
+    return (perf_counter() - start) / len(parsed_files)
+
+
+def compiled_per_file(parser, root_node) -> None:
+    """Previous behaviour, every query is compiled again for each file"""
+    for query_source in [parser.extraction_query, *parser.query_sources.values()]:
+        parser.language.query(query_source).captures(root_node)
+
+
+def compiled_once(parser, root_node) -> None:
+    for query in parser.queries.values():
+        query.captures(root_node)
+
+
+def main(directory: Path) -> None:
+    files = source_files(directory)
+    parsed_files = [
+        (parser, parser.parser.parse(file_bytes).root_node) for parser, file_bytes in files
+    ]
+    print(f'{len(parsed_files)} files from {directory}')
+    before = time_per_file(parsed_files, compiled_per_file)
+    after = time_per_file(parsed_files, compiled_once)
+    print(f'compiled per file: {before * 1000:.3f}ms per file')
+    print(f'compiled once:     {after * 1000:.3f}ms per file')
+    print(f'speedup:           {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else Path('.'))
@@ -0,0 +1,54 @@
+"""Turning the function call graph and the file level graph of a directory into vis.js json
+through pyvis versus src.vis_payload, comparing the time taken and the payload size.
+
+run from the repository root with `python benchmarks/vis_payload.py [directory] [max_depth]`
+"""
+import json
+import sys
+from copy import deepcopy
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+
+from pyvis.network import Network  # noqa: E402
+
+from graphing import build_graphs_for_project  # noqa: E402
+from vis_payload import vis_parameters  # noqa: E402
+
+
+def pyvis_parameters(nx_graph) -> tuple[str, str]:
+    """Previous behaviour, copied from main.py"""
+    nt = Network(directed=True, bgcolor='#f2f3f4')
+    nt.from_nx(nx_graph)
+    network_data = nt.get_network_data()
+    vis_data = {"nodes": network_data[0], "edges": network_data[1]}
+    return json.dumps(vis_data), nt.options.to_json()
+
+
+def timed(serialize, graph) -> tuple[float, int]:
+    # pyvis writes sizes and widths into the graph it is given
+    graph = deepcopy(graph)
+    start = perf_counter()
+    data, options = serialize(graph)
+    return perf_counter() - start, len(data) + len(options)
+
+
+def main() -> None:
+    directory = Path(sys.argv[1] if len(sys.argv) > 1 else '.')
+    max_depth = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    file_level_graph, function_call_graph = build_graphs_for_project(
+        local_project_dir=directory, max_depth=max_depth, parse_cache=None
+    )
+    for name, graph in (('files', file_level_graph), ('functions', function_call_graph)):
+        before, before_size = timed(pyvis_parameters, graph)
+        after, after_size = timed(vis_parameters, graph)
+        print(
+            f'{name}: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges, '
+            f'pyvis {before:.2f}s {before_size / 1024:.0f}KiB, '
+            f'vis_payload {after:.3f}s {after_size / 1024:.0f}KiB, {before / after:.0f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
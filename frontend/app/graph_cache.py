@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from hashlib import sha256
+from typing import Optional
+
+from src.graph_clustering import ClusterTree
+from src.vis_payload import dumps
+
+
+@dataclass(frozen=True)
+class GraphOptions:
+    """everything besides the commit that changes the graphs built for a repository"""
+
+    max_depth: int = 3
+    # Most nodes the first view of the function call graph shows, see ClusterTree
+    node_budget: int = 500
+
+
+@dataclass(frozen=True)
+class CachedGraph:
+    body: bytes
+    etag: str
+    created: float
+    # The serialized details of every node, sent one at a time when a node is clicked
+    nodes: dict[str, bytes] = field(default_factory=dict)
+    # The clusters the function call graph is first shown in, expanded on request
+    clusters: Optional[ClusterTree] = None
+    # The options the graphs were built with, clusters are expanded with the same budget
+    options: GraphOptions = GraphOptions()
+
+    @property
+    def size(self) -> int:
+        size = len(self.body) + sum(len(details) for details in self.nodes.values())
+        return size if self.clusters is None else size + self.clusters.size
+
+
+def graph_key(repository: str, commit: str, options: GraphOptions) -> str:
+    """a stable id for the graphs of a repository at a commit, also used in graph urls"""
+    key = json.dumps([repository, commit, asdict(options)], sort_keys=True)
+    return sha256(key.encode()).hexdigest()
+
+
+class GraphCache:
+    """serialized graphs kept for ttl seconds, evicting least recently used entries first"""
+
+    def __init__(
+        self, ttl: float = 3600, max_entries: int = 64, max_bytes: int = 256 * 2**20
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, CachedGraph] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedGraph]:
+        with self.lock:
+            cached_graph = self.entries.get(key)
+            if cached_graph is None:
+                return None
+            if time.time() - cached_graph.created > self.ttl:
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return cached_graph
+
+    def put(
+        self,
+        key: str,
+        graphs: dict,
+        nodes: Optional[dict] = None,
+        clusters: Optional[ClusterTree] = None,
+        options: GraphOptions = GraphOptions(),
+    ) -> CachedGraph:
+        body = dumps(graphs)
+        cached_graph = CachedGraph(
+            body=body,
+            etag=f'"{sha256(body).hexdigest()[:32]}"',
+            created=time.time(),
+            nodes={node: dumps(details) for node, details in (nodes or {}).items()},
+            clusters=clusters,
+            options=options,
+        )
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = cached_graph
+            self.size += cached_graph.size
+            # The newest entry is always kept, even when it is larger than max_bytes on its own
+            while len(self.entries) > 1 and (
+                len(self.entries) > self.max_entries or self.size > self.max_bytes
+            ):
+                self.remove(next(iter(self.entries)))
+        return cached_graph
+
+    def remove(self, key: str) -> None:
+        self.size -= self.entries.pop(key).size
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+from uuid import uuid4
+
+from frontend.app.graph_cache import GraphCache, GraphOptions, graph_key
+from src.files_from_github import head_commit, tarball_file_list
+from src.graph_clustering import ClusterTree
+from src.graphing import build_graphs_for_project, nodes_with_content
+from src.parse_cache import ParseCache
+from src.vis_payload import node_details, vis_data
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """a repository analysis submitted to the job queue"""
+
+    id: str
+    repository: str
+    status: str = QUEUED
+    stage: str = "waiting for a worker"
+    result: Any = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> dict:
+        job = {
+            "id": self.id,
+            "repository": self.repository,
+            "status": self.status,
+            "stage": self.stage,
+            "submitted": self.submitted,
+            "finished": self.finished,
+        }
+        if self.status == DONE:
+            job["result"] = self.result
+        if self.status == FAILED:
+            job["error"] = self.error
+        return job
+
+
+def repository_key(repository_link: str) -> str:
+    """normalises a repository link so the same repository always maps to one job"""
+    repository = repository_link.strip().removeprefix("https://").removeprefix("github.com/")
+    return repository.removesuffix("/").removesuffix(".git").lower()
+
+
+def analyze_repository(
+    repository_link: str,
+    report: Callable[[str], None],
+    graph_cache: GraphCache,
+    options: GraphOptions = GraphOptions(),
+    parse_cache: Optional[ParseCache] = None,
+    parse_executor: Optional[Executor] = None,
+    parse_workers: int = 1,
+) -> dict:
+    """builds the vis.js graphs of the latest commit of a repository unless they are cached
+
+    Files are parsed in parse_executor, a process pool shared by the analysis threads of a
+    JobQueue, which would otherwise parse one file at a time between them. parse_workers
+    is the number of processes of the pool.
+    """
+    report("resolving the latest commit")
+    commit = head_commit(repository_link)
+    key = graph_key(repository_key(repository_link), commit, options)
+    if graph_cache.get(key) is None:
+        report("fetching files")
+        github_filelist = tarball_file_list(repository_link, ref=commit)
+        report(f"building graphs from {len(github_filelist)} files")
+        file_level_graph, function_call_graph = build_graphs_for_project(
+            github_filelist=github_filelist,
+            max_depth=options.max_depth,
+            parse_cache=parse_cache,
+            workers=parse_workers,
+            executor=parse_executor,
+        )
+        # Function nodes only keep the span of their source, it is shown when one is clicked
+        files = {file.path: file for file in github_filelist}
+        nodes_with_content(function_call_graph, lambda path: files[path].decoded_content)
+        # The function call graph can have tens of thousands of nodes, it is sent as
+        # clusters that the browser expands through /graphs/<key>/clusters/<cluster>
+        clusters = ClusterTree(function_call_graph)
+        functions = clusters.vis_data(clusters.level_of_detail(options.node_budget))
+        graph_cache.put(
+            key,
+            {"files": vis_data(file_level_graph), "functions": functions},
+            node_details(function_call_graph),
+            clusters,
+            options,
+        )
+    return {"commit": commit, "graph": f"/graphs/{key}"}
+
+
+class JobQueue:
+    """runs analyses on a worker pool, sharing one job between identical in-flight requests
+
+    The workers are threads, so they overlap the network and git work of analyses. Work
+    that holds the GIL, like parsing, has to be handed to processes by the analysis.
+    """
+
+    def __init__(
+        self,
+        analyze: Callable[[str, Callable[[str], None]], Any],
+        workers: int = 4,
+        max_finished_jobs: int = 256,
+    ):
+        self.analyze = analyze
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.in_flight: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, repository_link: str) -> Job:
+        """returns the in-flight job for the repository, or queues a new one"""
+        key = repository_key(repository_link)
+        with self.lock:
+            job_id = self.in_flight.get(key)
+            if job_id is not None:
+                return self.jobs[job_id]
+            job = Job(id=uuid4().hex, repository=repository_link)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job.id
+        self.executor.submit(self.run, job, key)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run(self, job: Job, key: str) -> None:
+        job.status = RUNNING
+
+        def report(stage: str) -> None:
+            job.stage = stage
+
+        try:
+            job.result = self.analyze(job.repository, report)
+            job.status, job.stage = DONE, "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status, job.stage = FAILED, "failed"
+        finally:
+            job.finished = time.time()
+            with self.lock:
+                del self.in_flight[key]
+                self.drop_finished_jobs()
+
+    def drop_finished_jobs(self) -> None:
+        """forgets the oldest finished jobs once there are more than max_finished_jobs"""
+        finished_jobs = [job_id for job_id, job in self.jobs.items() if not job.in_flight]
+        for job_id in finished_jobs[: max(0, len(finished_jobs) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
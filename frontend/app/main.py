@@ -1,13 +1,39 @@
-from fastapi import FastAPI, Request
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, status
 from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from toolz.functoolz import pipe
+from pydantic import BaseModel
 
-from src.files_from_github import file_list
-from src.graphing import get_network_from_gh_filelist
+from frontend.app.graph_cache import GraphCache
+from frontend.app.jobs import JobQueue, analyze_repository
+from src.parse_cache import ParseCache
+from src.repository_processing import from_url
+from src.vis_payload import dumps
 
 app = FastAPI()
+graph_cache = GraphCache()
+ANALYSIS_WORKERS = 4
+PARSE_WORKERS = os.cpu_count() or 1
+# One pool for every analysis thread. Forking a process that runs threads can copy a lock
+# another thread holds, so the workers are started by a fork server instead
+parse_executor = ProcessPoolExecutor(
+    max_workers=PARSE_WORKERS, mp_context=get_context("forkserver")
+)
+jobs = JobQueue(
+    partial(
+        analyze_repository,
+        graph_cache=graph_cache,
+        parse_cache=ParseCache(),
+        parse_executor=parse_executor,
+        parse_workers=PARSE_WORKERS,
+    ),
+    workers=ANALYSIS_WORKERS,
+)
 
 templates = Jinja2Templates(directory="frontend/templates")
 app.mount("/frontend/static", StaticFiles(directory="frontend/static"), name="static")
@@ -30,12 +56,70 @@ async def tool(request: Request):
     return templates.TemplateResponse("page.html", {"request": request, "data": data})
 
 
-@app.get("/tool/{page_name}", response_class=HTMLResponse)
-async def repo(request: Request, page_name: str):
-    graph = pipe(
-        "https://github.com/python/mypy",
-        file_list,
-        get_network_from_gh_filelist,
+class JobRequest(BaseModel):
+    repository: str
+
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    jobs.shutdown()
+    parse_executor.shutdown(wait=False, cancel_futures=True)
+
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(job_request: JobRequest):
+    return jobs.submit(job_request.repository).to_dict()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown job")
+    return job.to_dict()
+
+
+@app.get("/graphs/{graph_id}")
+async def graphs(graph_id: str, if_none_match: str | None = Header(default=None)):
+    cached_graph = graph_cache.get(graph_id)
+    if cached_graph is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown graph")
+    # A graph id pins the commit and the options, so the body behind it never changes
+    headers = {"ETag": cached_graph.etag, "Cache-Control": "private, max-age=3600"}
+    if if_none_match == cached_graph.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(cached_graph.body, media_type="application/json", headers=headers)
+
+
+@app.get("/graphs/{graph_id}/nodes/{node_id:path}")
+async def graph_node(graph_id: str, node_id: str):
+    cached_graph = graph_cache.get(graph_id)
+    if cached_graph is None or node_id not in cached_graph.nodes:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown node")
+    headers = {"Cache-Control": "private, max-age=3600"}
+    return Response(
+        cached_graph.nodes[node_id], media_type="application/json", headers=headers
     )
-    data = {"page": graph.__str__()}
+
+
+@app.get("/graphs/{graph_id}/clusters/{cluster_id:path}")
+async def graph_cluster(graph_id: str, cluster_id: str, offset: int = Query(default=0, ge=0)):
+    cached_graph = graph_cache.get(graph_id)
+    children = None
+    if cached_graph is not None and cached_graph.clusters is not None:
+        # Large clusters are sent a node budget at a time, the rest from the next offset
+        children = cached_graph.clusters.expand(
+            cluster_id, cached_graph.options.node_budget, offset
+        )
+    if children is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown cluster")
+    headers = {"Cache-Control": "private, max-age=3600"}
+    return Response(dumps(children), media_type="application/json", headers=headers)
+
+
+@app.get("/tool/{page_name:path}", response_class=HTMLResponse)
+async def repo(request: Request, page_name: str):
+    # page_name is a % encoded repository url, see src.repository_processing.to_url
+    job = jobs.submit(from_url(page_name))
+    data = {"page": job.repository, "job_id": job.id}
     return templates.TemplateResponse("page.html", {"request": request, "data": data})
@@ -1,6 +1,4 @@
 import json
-import os
-import pickle
 import re
 from functools import wraps
 from typing import Any, AnyStr, Callable, Optional, Pattern
@@ -10,13 +8,17 @@ from github import Github, Repository
 from google.cloud import firestore
 from google.oauth2 import service_account
 from networkx import Graph
-from pyvis.network import Network
 from toolz.functoolz import pipe
 
-from python_components.large_lang_model import ai_magic
-from python_components.networkx_graphing import get_graphs
-from python_components.old_types import Package, T
+from python_components.firestore_writer import BufferedWriter
+from python_components.import_scanner import file_imports
+from python_components.networkx_graphing import get_graphs, node_data
+from python_components.old_types import T
+from python_components.repo_store import RepoStore
+from python_components.scoring import ScoringSettings, score_files
+from src.completion_cache import CompletionCache
 from src.streamlit_components.graph_visualizer import my_component
+from src.vis_payload import vis_parameters
 
 st.set_page_config(layout='wide')
 if 'init' not in st.session_state:
@@ -33,20 +35,26 @@ def extract_and_remove_pattern(
     return pattern.findall(code), pattern.sub('\n', code)
 
 
+COMMENT_PATTERN = re.compile('#.*?\n')
+DOCS_PATTERN = re.compile(r'""".*?"""', re.DOTALL)
+STRING_PATTERN = re.compile(r'".*?"')
+SINGLE_QUOTE_STRING_PATTERN = re.compile(r"'.*?'")
+
+
 def remove_comments(code: str) -> str:
-    return re.sub(re.compile('#.*?\n'), '', code)
+    return COMMENT_PATTERN.sub('', code)
 
 
 def remove_docs(code: str) -> str:
-    return re.sub(re.compile(re.compile(r'""".*?"""', re.DOTALL)), '', code)
+    return DOCS_PATTERN.sub('', code)
 
 
 def remove_strings(code: str) -> str:
-    return re.sub(re.compile(r'".*?"'), '', code)
+    return STRING_PATTERN.sub('', code)
 
 
 def remove_single_quote_strings(code: str) -> str:
-    return re.sub(re.compile(r"'.*?'"), '', code)
+    return SINGLE_QUOTE_STRING_PATTERN.sub('', code)
 
 
 def clean_code(code: str) -> str:
@@ -107,49 +115,6 @@ def get_repo(repo_path: str) -> Repository:
     return g.get_repo(repo_path)
 
 
-def vis_parameters(nx_graph: Graph) -> tuple[str, str]:
-    nt = Network(directed=True, bgcolor='#f2f3f4')
-    nt.from_nx(nx_graph)
-    network_data = nt.get_network_data()
-    vis_data = {"nodes": network_data[0], "edges": network_data[1]}
-    return json.dumps(vis_data), nt.options.to_json()
-
-
-def import_line_to_packages(import_line: str) -> Package:
-    clean_line = re.sub('as\s+\S+', '', import_line).replace('.', '/')  # noqa
-    for symbol in ['\n', '(', ')', ',', 'import']:
-        clean_line = clean_line.replace(symbol, '')
-    packages = clean_line.split()
-    return Package(packages[0], packages[1:])
-
-
-def add_packages_to_root(package: Package) -> list[str]:
-    if package.packages:
-        return [
-            f'{package.root}/{imported_package}'
-            for imported_package in package.packages
-        ]
-    else:
-        return [f'{package.root}']
-
-
-def packages_from_line(line: str, file_name: str) -> list[str]:
-    package = import_line_to_packages(line)
-    stripped_root = package.root.lstrip('/')
-    difference = len(package.root) - len(stripped_root)
-    if difference > 0:
-        root_folder = "/".join(list(file_name.split('/')[:-difference]))
-        package.root = f'{root_folder}{stripped_root}'
-    return add_packages_to_root(package)
-
-
-def file_package_imports(import_lines: list[str], file_name: str) -> list[str]:
-    package_imports = []
-    for line in import_lines:
-        package_imports += packages_from_line(line, file_name)
-    return package_imports
-
-
 def hex_to_rgb(h: str) -> tuple[int, int, int]:
     return tuple(int(h.lstrip('#')[i : i + 2], 16) for i in (0, 2, 4))
 
@@ -171,9 +136,37 @@ def score_to_colour(score: float) -> str:
     )
 
 
+def add_scores(node_info: dict, reviews: dict) -> dict:
+    average_score = 0
+    for key in prompts:
+        try:
+            review = reviews[(node_info['id'], key)]
+            if isinstance(review, Exception):
+                raise review
+            save_prompt(review.fin.encode('utf-8'), review.exceed_len)
+            score = review.score
+            node_info[key] = {
+                'response': f'1:{remove_empty_lines(review.out_1)}',
+                'score': score,
+            }
+        except Exception:
+            print("API error")
+            score = 5
+            node_info[key] = {
+                'response': 'Error in the API response',
+                'score': score,
+            }
+        average_score += score
+        node_info['title'] = node_info['title'] + f'\n{key}: {score}'
+    average_score = average_score / 4
+    node_info['color'] = score_to_colour(average_score)
+    node_info['score'] = average_score
+    return node_info
+
+
 @st.cache
-def extract_data_from_repo(repo_link: str) -> list[dict]:
-    nodes = []
+def extract_data_from_repo(repo_link: str) -> str:
+    unscored_nodes = []
     repo = pipe(repo_link.removeprefix('https://github.com/'), get_repo)
     contents = repo.get_contents('.')
     while contents:
@@ -185,25 +178,8 @@ def extract_data_from_repo(repo_link: str) -> list[dict]:
                 file_path = file_content.path.rstrip('py').rstrip('.')
                 file_content = file_content.decoded_content.decode()
 
-                ###################################################
                 code = clean_code(file_content)
-                from_with_braces = re.compile(r'from\s+(.+\s+import\s+\((?:.|\n)+?\))')
-                from_with_braces, new_code = extract_and_remove_pattern(
-                    from_with_braces, code
-                )
-                from_import = re.compile(r'from\s+(.+)')
-                from_import, new_code = extract_and_remove_pattern(
-                    from_import, new_code
-                )
-                import_pattern = re.compile(r'import\s+(.+)')
-                import_pattern, new_code = extract_and_remove_pattern(
-                    import_pattern, new_code
-                )
-                packages = file_package_imports(from_with_braces, file_path)
-                packages += file_package_imports(from_import, file_path)
-                packages += file_package_imports(import_pattern, file_path)
-
-                ####################################################
+                packages = file_imports(file_content, file_path)
                 file_name = file_path.split('/')[-1]
                 node_info = {
                     'id': file_path,
@@ -214,39 +190,17 @@ def extract_data_from_repo(repo_link: str) -> list[dict]:
                     'imports': packages,
                     'type': 'internal',
                 }
-                average_score = 0
-                for key, prompt in prompts.items():
-                    try:
-                        out_1, out_2, fin, exceed_len = ai_magic(prompt, code)
-                        encoded_fin = fin.encode('utf-8')
-                        save_prompt(encoded_fin, exceed_len)
-                        score = int(re.findall(r'\d+', out_2)[0])
-                        node_info[key] = {
-                            'response': f'1:{remove_empty_lines(out_1)}',
-                            'score': score,
-                        }
-                        average_score += score
-                        node_info['title'] = node_info['title'] + f'\n{key}: {score}'
-                    except Exception:
-                        print("API error")
-                        score = 5
-                        node_info[key] = {
-                            'response': 'Error in the API response',
-                            'score': score,
-                        }
-                        average_score += score
-                        node_info['title'] = node_info['title'] + f'\n{key}: {score}'
-                average_score = average_score / 4
-                node_info['color'] = score_to_colour(average_score)
-                node_info['score'] = average_score
-
-                nodes.append(node_info)
-    with open(
-        f"analyzed_repos/{repo_link.removeprefix('https://github.com/').replace('/', '_o_')}",
-        'wb',
-    ) as f:
-        pickle.dump(nodes, f)
-    return nodes
+                unscored_nodes.append((node_info, code))
+    reviews = score_files(
+        [(node_info['id'], code) for node_info, code in unscored_nodes],
+        prompts,
+        scoring_settings,
+        completion_cache,
+    )
+    nodes = [add_scores(node_info, reviews) for node_info, _ in unscored_nodes]
+    repository = repo_link.removeprefix('https://github.com/')
+    repo_store.save(repository, nodes)
+    return repository
 
 
 def remove_empty_lines(text: str) -> str:
@@ -254,103 +208,117 @@ def remove_empty_lines(text: str) -> str:
 
 
 def save_prompt(fin: bytes, exceed_len: int):
-    database.collection('ai_responses').add(
-        {'response': fin, 'exceeded_lenght': exceed_len}
-    )
+    response_writer.add({'response': fin, 'exceeded_lenght': exceed_len})
 
 
-def read_pickle(file_path):
-    with open(file_path, 'rb') as f:
-        return pickle.load(f)
-
-
-def setup(secrets: dict) -> tuple[firestore.Client, dict, Github]:
-    key_dict = json.loads(secrets["db_key"])
-    credentials = service_account.Credentials.from_service_account_info(key_dict)
+def setup(secrets: dict) -> tuple[dict, Github]:
     return (
-        firestore.Client(credentials=credentials),
         json.loads(secrets["prompts"]),
         authenticate_github(json.loads(secrets['github_token'])['secondary']),
     )
 
 
-database, prompts, g = setup(st.secrets)
+# Streamlit reruns the script on every interaction, so the writer and its flush thread
+# are created once and shared between reruns
+@st.cache(allow_output_mutation=True)
+def get_response_writer(db_key: str) -> BufferedWriter:
+    credentials = service_account.Credentials.from_service_account_info(json.loads(db_key))
+    return BufferedWriter(firestore.Client(credentials=credentials), 'ai_responses')
+
+
+# One sqlite connection to the completion cache is shared between reruns as well
+@st.cache(allow_output_mutation=True)
+def get_completion_cache() -> CompletionCache:
+    return CompletionCache()
+
+
+# The store keeps the blobs it has read memory mapped, one store is shared between reruns
+@st.cache(allow_output_mutation=True)
+def get_repo_store() -> RepoStore:
+    return RepoStore('analyzed_repos')
+
+
+prompts, g = setup(st.secrets)
+response_writer = get_response_writer(st.secrets["db_key"])
+scoring_settings = ScoringSettings(
+    api_key=json.loads(st.secrets['openai_key'])['api_key'], mode='combined'
+)
+completion_cache = get_completion_cache()
+repo_store = get_repo_store()
 
 
-def data_display(data, temp):
+# Streamlit reruns the script on every interaction, the graphs are built once per saved
+# generation of a repository and shared between reruns instead
+@st.cache(allow_output_mutation=True)
+def repository_graphs(repository: str, generation: str) -> tuple[Graph, Graph]:
+    return get_graphs(repo_store.nodes(repository))
+
+
+@st.cache
+def repository_vis_parameters(
+    repository: str, generation: str, show_external: bool
+) -> tuple[str, str]:
+    graph, sub_graph = repository_graphs(repository, generation)
+    return vis_parameters(graph if show_external else sub_graph)
+
+
+def data_display(repository, temp):
     temp.text("Repo-review in progress...")
 
-    graph, sub_graph = get_graphs(data)
-    vis_data, options = vis_parameters(graph)
-    sub_data, sub_options = vis_parameters(sub_graph)
+    generation = repo_store.generation(repository)
+    graph, _ = repository_graphs(repository, generation)
     chk = temp.checkbox('Show external modules')
-    if chk:
-        result = my_component(vis_data, options)
-    else:
-        result = my_component(sub_data, sub_options)
+    result = my_component(*repository_vis_parameters(repository, generation, chk))
     if result == 0:
         print(result)
     else:
-        node_data = graph.nodes.get(result)
-        if node_data['type'] == 'external':
+        node_info = node_data(graph, result)
+        if node_info['type'] == 'external':
             with st.sidebar:
                 st.text('File: ' + result + '.py')
                 st.text('External module')
         else:
             with st.sidebar:
                 st.text('File: ' + result + '.py')
-                st.text(f"Overall score: {node_data['score']}")
+                st.text(f"Overall score: {node_info['score']}")
                 category = st.selectbox('Category', prompts.keys())
                 st.text(category)
-                st.text(f"Score: {node_data[category]['score']}")
-                st.text(node_data[category]['response'])
-                st.code(node_data['code'])
+                st.text(f"Score: {node_info[category]['score']}")
+                st.text(repo_store.response(repository, result, category))
+                st.code(repo_store.code(repository, result))
 
 
 def dev_main():
     temp = st.empty()
-    dir_to_repos = 'analyzed_repos/'
-    analysed_repo_data = {}
-    for repo_link in os.listdir(dir_to_repos):
-        analysed_repo_data[repo_link.replace('_o_', '/')] = read_pickle(
-            dir_to_repos + repo_link
-        )
     with temp.container():
         repo_link = st.text_input(
             'Input a github repo url (Hint: only open-source repos are supported for now)'
         )
         analysed_repo = st.selectbox(
-            'Or choose an already analyzed one', analysed_repo_data.keys()
+            'Or choose an already analyzed one', repo_store.repositories()
         )
         button = st.button('Submit')
     if button:
         st.session_state['init'] = False
     if repo_link:
-        data = extract_data_from_repo(repo_link)
+        repository = extract_data_from_repo(repo_link)
     else:
-        data = analysed_repo_data[analysed_repo]
+        repository = analysed_repo
     if not st.session_state['init']:
-        data_display(data, temp)
+        data_display(repository, temp)
 
 
 def prod_main():
     temp = st.empty()
-    dir_to_repos = 'analyzed_repos/'
-    analysed_repo_data = {}
-    for repo_link in os.listdir(dir_to_repos):
-        analysed_repo_data[repo_link.replace('_o_', '/')] = read_pickle(
-            dir_to_repos + repo_link
-        )
     with temp.container():
         analysed_repo = st.selectbox(
-            'Or choose an already analyzed one', analysed_repo_data.keys()
+            'Or choose an already analyzed one', repo_store.repositories()
         )
         button = st.button('Submit')
     if button:
         st.session_state['init'] = False
-    data = analysed_repo_data[analysed_repo]
     if not st.session_state['init']:
-        data_display(data, temp)
+        data_display(analysed_repo, temp)
 
 
 def main(release: bool = False) -> None:
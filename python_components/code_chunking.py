@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from textwrap import dedent
+from typing import Iterator
+
+from src.custom_language_parsers import LANGUAGES, CustomLanguageSyntaxParser
+
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class CodeChunk:
+    """a run of whole definitions and statements of a file, small enough for one prompt"""
+
+    start_line: int
+    end_line: int
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass
+class Unit:
+    start_byte: int
+    end_byte: int
+    start_line: int
+    end_line: int
+
+
+def estimate_tokens(text: str | bytes) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def comment_ranges(tree_node) -> list[tuple[int, int]]:
+    """byte ranges of every comment, line_comment and block_comment node in the tree"""
+    ranges, nodes = [], [tree_node]
+    while nodes:
+        node = nodes.pop()
+        if node.type.endswith('comment'):
+            ranges.append((node.start_byte, node.end_byte))
+        else:
+            nodes.extend(node.children)
+    return sorted(ranges)
+
+
+def line_units(code_bytes: bytes, node, max_tokens: int) -> Iterator[Unit]:
+    """splits a node without smaller parts, such as a huge string, at line boundaries"""
+    start_byte, line = node.start_byte, node.start_point[0]
+    while start_byte < node.end_byte:
+        end_byte = min(node.end_byte, start_byte + max_tokens * CHARS_PER_TOKEN)
+        newline = code_bytes.rfind(b'\n', start_byte, end_byte)
+        if end_byte < node.end_byte and newline > start_byte:
+            end_byte = newline + 1
+        end_line = line + code_bytes.count(b'\n', start_byte, end_byte)
+        yield Unit(start_byte, end_byte, line, end_line)
+        start_byte, line = end_byte, end_line
+
+
+def units(code_bytes: bytes, node, max_tokens: int) -> Iterator[Unit]:
+    """the largest syntax nodes that fit the budget, splitting definitions only when needed"""
+    for child in node.children:
+        if child.type.endswith('comment'):
+            continue
+        if estimate_tokens(code_bytes[child.start_byte : child.end_byte]) <= max_tokens:
+            yield Unit(
+                child.start_byte, child.end_byte, child.start_point[0], child.end_point[0]
+            )
+        elif child.children:
+            yield from units(code_bytes, child, max_tokens)
+        else:
+            yield from line_units(code_bytes, child, max_tokens)
+
+
+def compact(code_bytes: bytes, start_byte: int, end_byte: int, comments: list) -> str:
+    """chunk text without comments, blank lines and the indentation shared by every line"""
+    parts, position = [], start_byte
+    for comment_start, comment_end in comments:
+        if comment_end <= start_byte or comment_start >= end_byte:
+            continue
+        parts.append(code_bytes[position:comment_start])
+        position = comment_end
+    parts.append(code_bytes[position:end_byte])
+    text = b''.join(parts).decode('utf-8', errors='replace')
+    return dedent('\n'.join(line.rstrip() for line in text.splitlines() if line.strip()))
+
+
+def chunk_code(
+    code: str,
+    language: CustomLanguageSyntaxParser = LANGUAGES['py'],
+    max_tokens: int = 2000,
+) -> list[CodeChunk]:
+    """splits code into consecutive chunks of whole syntax nodes of at most max_tokens each"""
+    code_bytes = code.encode('utf-8')
+    tree = language.parser.parse(code_bytes)
+    comments = comment_ranges(tree.root_node)
+    chunks, chunk_units = [], []
+
+    def close_chunk():
+        start, end = chunk_units[0], chunk_units[-1]
+        text = compact(code_bytes, start.start_byte, end.end_byte, comments)
+        if text:
+            chunks.append(CodeChunk(start.start_line + 1, end.end_line + 1, text))
+
+    for unit in units(code_bytes, tree.root_node, max_tokens):
+        if chunk_units and (
+            estimate_tokens(code_bytes[chunk_units[0].start_byte : unit.end_byte])
+            > max_tokens
+        ):
+            close_chunk()
+            chunk_units = []
+        chunk_units.append(unit)
+    if chunk_units:
+        close_chunk()
+    return chunks
@@ -0,0 +1,99 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """adds documents to a Firestore collection in batch commits from a background thread
+
+    add() only puts the document on a queue. A batch is committed once max_batch_size
+    documents are waiting or flush_interval seconds after the first of them arrived.
+    Any client with the batch() and collection() methods of firestore.Client works,
+    including one connected to the emulator.
+    """
+
+    def __init__(
+        self,
+        client,
+        collection: str = 'ai_responses',
+        max_batch_size: int = MAX_BATCH_SIZE,
+        flush_interval: float = 2.0,
+        max_attempts: int = 3,
+        backoff: float = 1.0,
+    ):
+        self.client = client
+        self.collection = collection
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.documents = queue.Queue()
+        self.committed = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self.run, name='firestore-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def add(self, document: dict) -> None:
+        self.documents.put(document)
+
+    def next_batch(self) -> Optional[list[dict]]:
+        """blocks for the first document, then gathers more until the batch is due"""
+        document = self.documents.get()
+        if document is None:
+            return None
+        batch = [document]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            try:
+                document = self.documents.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if document is None:
+                # Put the stop marker back so run() sees it once this batch is committed
+                self.documents.put(None)
+                break
+            batch.append(document)
+        return batch
+
+    def run(self) -> None:
+        while (batch := self.next_batch()) is not None:
+            self.commit(batch)
+
+    def commit(self, documents: list[dict]) -> None:
+        collection = self.client.collection(self.collection)
+        for attempt in range(self.max_attempts):
+            batch = self.client.batch()
+            for document in documents:
+                batch.set(collection.document(), document)
+            try:
+                batch.commit()
+            except Exception:
+                logger.warning(
+                    'Writing %d documents to Firestore failed, attempt %d of %d',
+                    len(documents),
+                    attempt + 1,
+                    self.max_attempts,
+                    exc_info=True,
+                )
+                if attempt + 1 < self.max_attempts:
+                    time.sleep(self.backoff * 2**attempt)
+                continue
+            self.committed += len(documents)
+            return
+        self.failed += len(documents)
+        logger.error('Dropped %d documents that could not be written', len(documents))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """commits every document added so far and stops the background thread"""
+        if self.thread.is_alive():
+            self.documents.put(None)
+            self.thread.join(timeout)
@@ -0,0 +1,98 @@
+import re
+from typing import Iterable, Iterator
+
+from python_components.old_types import Package
+
+# DOTALL lets a backslash escape the newline inside a string as well
+STRING = r'''
+    \'\'\'[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*\'\'\'
+    |"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""
+    |'[^'\\\n]*(?:\\.[^'\\\n]*)*'
+    |"[^"\\\n]*(?:\\.[^"\\\n]*)*"
+'''
+# Whitespace within a statement, which a backslash continues on the next line
+SPACE = r'(?:[ \t]|\\\n)'
+# The names of a statement up to its end, backslashes are only allowed as line continuations
+NAMES = r'(?:[^\n;#\\]|\\\n)*'
+# Statements only start after a newline, ';' or ':', which leaves out 'raise ... from e'
+# and 'yield from'.
+STATEMENT = rf'''
+    [\n;:][ \t]*
+    (?:
+        from{SPACE}+(?P<module>\.*{SPACE}*[\w.]*){SPACE}+import{SPACE}*
+          (?P<from_names>\([^)]*\)|{NAMES})
+        | import{SPACE}+(?P<import_names>{NAMES})
+    )
+'''
+# Each match skips the code, strings and comments up to the next import statement in one
+# go, so a '#', a quote or an import inside a string or comment is never read as code and
+# the loop in python only runs once per import. A line is skipped together with the code
+# that starts it to keep the repetitions few. The statement is optional, so a match never
+# fails and backtracks once the skipping stops, and the code after the last import is a
+# single match.
+SOURCE_PATTERN = re.compile(
+    rf'''
+    (?:
+        [^'"\#\n;:]+
+        | {STRING}
+        | \#[^\n]*
+        | [\n;:](?![ \t]*(?:from|import)[ \t\\])[^'"\#\n;:]*
+    )*
+    (?:{STATEMENT})?
+    ''',
+    re.VERBOSE | re.DOTALL,
+)
+COMMENT_PATTERN = re.compile(r'#[^\n]*')
+ALIAS_PATTERN = re.compile(r'\s+as\s+\w+$')
+
+
+def imported_names(names: str) -> list[str]:
+    """'(a as b, c.d)' as ['a', 'c/d']"""
+    names = COMMENT_PATTERN.sub('', names).replace('\\\n', ' ').strip('() \t\n')
+    paths = []
+    for name in names.split(','):
+        name = ALIAS_PATTERN.sub('', name.strip())
+        if name:
+            paths.append(''.join(name.split()).replace('.', '/'))
+    return paths
+
+
+def relative_root(level: int, module: str, file_name: str) -> str:
+    """resolves 'from ..module' against the package directories of file_name"""
+    package = file_name.split('/')[:-level]
+    return '/'.join(part for part in [*package, module] if part)
+
+
+def scan_imports(code: str, file_name: str) -> Iterator[Package]:
+    """streams the imports of a python source as Package structures in a single pass
+
+    file_name is the path of the file without its extension, relative imports are resolved
+    against its directories.
+    """
+    # The newline lets a statement on the first line match like any other
+    for match in SOURCE_PATTERN.finditer('\n' + code):
+        if match['import_names'] is not None:
+            for path in imported_names(match['import_names']):
+                yield Package(path, [])
+        elif match['module'] is not None:
+            module = ''.join(match['module'].split())
+            root = module.lstrip('.').replace('.', '/')
+            level = len(module) - len(module.lstrip('.'))
+            if level:
+                root = relative_root(level, root, file_name)
+            yield Package(root, imported_names(match['from_names']))
+
+
+def package_paths(packages: Iterable[Package]) -> list[str]:
+    """the imported paths the graph is built from, 'root/package' or just 'root'"""
+    paths = []
+    for package in packages:
+        if package.packages:
+            paths.extend(f'{package.root}/{imported}' for imported in package.packages)
+        else:
+            paths.append(package.root)
+    return paths
+
+
+def file_imports(code: str, file_name: str) -> list[str]:
+    return package_paths(scan_imports(code, file_name))
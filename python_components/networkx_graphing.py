@@ -1,51 +1,93 @@
-from copy import deepcopy
+from collections import defaultdict
+from itertools import accumulate
 
 import networkx as nx
 
+INTERNAL_EDGE_WEIGHT = 5.0
+EXTERNAL_EDGE_WEIGHT = 1.0
+# Node attributes the graph is drawn with, kept on the nodes themselves
+DISPLAY_KEYS = {'label', 'title', 'size', 'color', 'shape', 'type'}
+
+
+class FileIndex:
+    """hash index over the file paths of a repository, for resolving imports to files
+
+    packages maps every directory and file path to the files below it, so the files of a
+    wildcard import are a single lookup instead of a scan over every file.
+    """
+
+    def __init__(self, file_names: list[str]):
+        self.files = set(file_names)
+        self.packages = defaultdict(list)
+        for file_name in file_names:
+            for prefix in accumulate(
+                file_name.split('/'), lambda path, part: f'{path}/{part}'
+            ):
+                self.packages[prefix].append(file_name)
+
+    def resolve(self, package: str) -> list[tuple[str, float]]:
+        """the nodes an import points to, with the weight of the edge to each of them"""
+        if package in self.files:
+            return [(package, INTERNAL_EDGE_WEIGHT)]
+        subpackage = package.rpartition('/')[0]
+        if '*' in package:
+            files = self.packages.get(subpackage, [])
+            return [(file_name, INTERNAL_EDGE_WEIGHT) for file_name in files]
+        if subpackage in self.files:
+            return [(subpackage, INTERNAL_EDGE_WEIGHT)]
+        return [(package.split('/')[0], EXTERNAL_EDGE_WEIGHT)]
+
 
 def fix_edges(
     graph_nodes: list[dict],
-) -> tuple[list[dict], tuple[str, str, float], list[str]]:
-    edge_weight = 5.0
+) -> tuple[list[dict], list[tuple[str, str, float]], list[str]]:
+    """resolves the imports of every node to files of the repository or external packages
+
+    Returns copies of the nodes with their resolved imports, the weighted edges from each
+    imported node to the importing file and the file names.
+    """
     file_names = [n['id'] for n in graph_nodes]
-    graph_edges = []
+    index = FileIndex(file_names)
+    nodes, graph_edges = [], []
     for graph_node in graph_nodes:
-        for i, package in enumerate(graph_node['imports']):
-            del graph_node['imports'][i]
-            if package in file_names:
-                graph_node['imports'].append(package)
-                graph_edges.append((package, graph_node['id'], edge_weight))
-            else:
-                split_package = package.split('/')
-                subpackage = "/".join(list(split_package[:-1]))
-                base_package = split_package[0]
-                if '*' in package:
-                    for file_name in file_names:
-                        if subpackage in file_name:
-                            graph_node['imports'].append(file_name)
-                            graph_edges.append((file_name, graph_node['id'], edge_weight))
-                elif subpackage in file_names:
-                    graph_node['imports'].append(subpackage)
-                    graph_edges.append((subpackage, graph_node['id'], edge_weight))
-                else:
-                    graph_node['imports'].append(base_package)
-                    graph_edges.append((base_package, graph_node['id'], 1.0))
-    return graph_nodes, graph_edges, file_names
+        imports = []
+        for package in graph_node['imports']:
+            for imported, weight in index.resolve(package):
+                imports.append(imported)
+                graph_edges.append((imported, graph_node['id'], weight))
+        nodes.append({**graph_node, 'imports': imports})
+    return nodes, graph_edges, file_names
 
 
 def without_keys(d, keys):
     return {k: v for k, v in d.items() if k not in keys}
 
 
+def with_keys(d, keys):
+    return {k: v for k, v in d.items() if k in keys}
+
+
 def get_graphs(edge_property_list: list[dict]) -> tuple[nx.Graph, nx.Graph]:
+    """the import graph of every file and external module, and a view of only the files
+
+    Nodes only carry what drawing the graph needs. The rest of each file's record is kept in
+    graph.graph['payloads'], which the view shares, so neither graph copies any node data.
+    """
     nodes, edges, files = fix_edges(edge_property_list)
-    graph = nx.DiGraph()
+    graph = nx.DiGraph(payloads={})
     graph.add_weighted_edges_from(edges)
+    file_set = set(files)
     for node in graph:
-        if not any(file == node for file in files):
+        if node not in file_set:
             graph.nodes[node]['color'] = '#ced7d8'
             graph.nodes[node]['shape'] = 'box'
             graph.nodes[node]['type'] = 'external'
     for node in nodes:
-        graph.add_node(node['id'], **without_keys(node, {'id'}))
-    return graph, deepcopy(graph).subgraph(files)
+        graph.add_node(node['id'], **with_keys(node, DISPLAY_KEYS))
+        graph.graph['payloads'][node['id']] = without_keys(node, DISPLAY_KEYS | {'id'})
+    return graph, graph.subgraph(files)
+
+
+def node_data(graph: nx.Graph, node: str) -> dict:
+    """the display attributes of a node together with its payload"""
+    return {**graph.nodes[node], **graph.graph['payloads'].get(node, {})}
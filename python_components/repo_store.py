@@ -0,0 +1,205 @@
+import fcntl
+import json
+import mmap
+import os
+import pickle
+import threading
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Optional
+from uuid import uuid4
+
+STORE_VERSION = 1
+MANIFEST = 'manifest.json'
+MANIFEST_LOCK = '.manifest.lock'
+
+
+def current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Temporary files are created readable by their owner only, stored files get the mode open()
+# gives a new file, as the pickles of the old store had
+FILE_MODE = 0o666 & ~current_umask()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """readers see either the previous file or the complete new one, never a partial write"""
+    with NamedTemporaryFile('wb', dir=path.parent, prefix='.', delete=False) as f:
+        f.write(data)
+        f.flush()
+        os.fchmod(f.fileno(), FILE_MODE)
+        os.fsync(f.fileno())
+    os.replace(f.name, path)
+
+
+def append_blob(blobs: bytearray, text: str) -> list[int]:
+    data = text.encode('utf-8')
+    offset = len(blobs)
+    blobs += data
+    return [offset, len(data)]
+
+
+def split_node(node: dict, blobs: bytearray) -> tuple[dict, dict]:
+    """separates the source code and llm responses of a node from what the graph needs"""
+    light_node, heavy_fields = {}, {}
+    for key, value in node.items():
+        if key == 'code':
+            heavy_fields['code'] = append_blob(blobs, value)
+        elif isinstance(value, dict) and 'response' in value:
+            light_node[key] = {k: v for k, v in value.items() if k != 'response'}
+            responses = heavy_fields.setdefault('responses', {})
+            responses[key] = append_blob(blobs, value['response'])
+        else:
+            light_node[key] = value
+    return light_node, heavy_fields
+
+
+class RepoStore:
+    """analysed repositories, listed from a small manifest with large fields read on demand
+
+    Every repository has an <owner>/<name> directory with three files written per save:
+    <generation>.nodes.json  node records without code and llm responses
+    <generation>.fields.json where the code and responses of each node are in the blobs
+    <generation>.blobs       the code and responses as utf-8, memory mapped when read
+    The manifest names the current generation, so replacing it publishes a save at once.
+    The blobs stay memory mapped until the store is closed, or used as a context manager.
+    """
+
+    def __init__(self, directory: str | Path = 'analyzed_repos'):
+        self.directory = Path(directory)
+        self._fields = {}
+        self._blobs = {}
+        self._blobs_lock = threading.Lock()
+
+    def __enter__(self) -> 'RepoStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._blobs_lock:
+            for blobs in self._blobs.values():
+                blobs.close()
+            self._blobs.clear()
+        self._fields.clear()
+
+    @contextmanager
+    def manifest_lock(self):
+        """serializes reading and replacing the manifest between threads and processes"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / MANIFEST_LOCK, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def manifest(self) -> dict:
+        try:
+            with open(self.directory / MANIFEST) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': STORE_VERSION, 'repositories': {}}
+
+    def repositories(self) -> list[str]:
+        return sorted(self.manifest()['repositories'])
+
+    def generation(self, repository: str) -> str:
+        """changes whenever the repository is saved again"""
+        return self.manifest()['repositories'][repository]['generation']
+
+    def path(self, repository: str, suffix: str, generation: Optional[str] = None) -> Path:
+        if generation is None:
+            generation = self.generation(repository)
+        return self.directory / repository / f'{generation}.{suffix}'
+
+    def nodes(self, repository: str) -> list[dict]:
+        """node records without the code and llm responses, a fresh copy on every call"""
+        with open(self.path(repository, 'nodes.json')) as f:
+            return json.load(f)
+
+    def fields(self, repository: str) -> dict:
+        path = self.path(repository, 'fields.json')
+        if path not in self._fields:
+            with open(path) as f:
+                self._fields[path] = json.load(f)
+        return self._fields[path]
+
+    def blob(self, repository: str, location: list[int]) -> str:
+        offset, length = location
+        if length == 0:
+            return ''
+        path = self.path(repository, 'blobs')
+        with self._blobs_lock:
+            if path not in self._blobs:
+                with open(path, 'rb') as f:
+                    self._blobs[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._blobs[path][offset : offset + length].decode('utf-8')
+
+    def code(self, repository: str, node_id: str) -> str:
+        return self.blob(repository, self.fields(repository)[node_id]['code'])
+
+    def response(self, repository: str, node_id: str, category: str) -> str:
+        return self.blob(repository, self.fields(repository)[node_id]['responses'][category])
+
+    def save(self, repository: str, nodes: list[dict]) -> None:
+        blobs = bytearray()
+        light_nodes, fields = [], {}
+        for node in nodes:
+            light_node, fields[node['id']] = split_node(node, blobs)
+            light_nodes.append(light_node)
+
+        generation = uuid4().hex
+        (self.directory / repository).mkdir(parents=True, exist_ok=True)
+        files = {
+            'blobs': bytes(blobs),
+            'fields.json': json.dumps(fields, separators=(',', ':')).encode(),
+            'nodes.json': json.dumps(light_nodes, separators=(',', ':')).encode(),
+        }
+        for suffix, data in files.items():
+            write_atomic(self.path(repository, suffix, generation), data)
+
+        # Saves of other repositories in between would be lost without the lock
+        with self.manifest_lock():
+            manifest = self.manifest()
+            previous = manifest['repositories'].get(repository)
+            manifest['repositories'][repository] = {
+                'generation': generation,
+                'nodes': len(light_nodes),
+            }
+            write_atomic(self.directory / MANIFEST, json.dumps(manifest, indent=1).encode())
+        if previous is not None:
+            self.remove_generation(repository, previous['generation'])
+
+    def remove_generation(self, repository: str, generation: str) -> None:
+        # Memory maps of the removed files in other stores stay readable until they are closed
+        for suffix in ('nodes.json', 'fields.json', 'blobs'):
+            with suppress(FileNotFoundError):
+                os.remove(self.path(repository, suffix, generation))
+        self._fields.pop(self.path(repository, 'fields.json', generation), None)
+        with self._blobs_lock:
+            blobs = self._blobs.pop(self.path(repository, 'blobs', generation), None)
+            if blobs is not None:
+                blobs.close()
+
+
+def migrate_pickles(directory: str | Path = 'analyzed_repos') -> list[str]:
+    """moves the pickled node lists of the old store into a RepoStore and deletes them"""
+    store = RepoStore(directory)
+    migrated = []
+    for path in sorted(Path(directory).iterdir()):
+        if not path.is_file() or path.name == MANIFEST or path.name.startswith('.'):
+            continue
+        with open(path, 'rb') as f:
+            nodes = pickle.load(f)
+        repository = path.name.replace('_o_', '/')
+        store.save(repository, nodes)
+        os.remove(path)
+        migrated.append(repository)
+    return migrated
+
+
+if __name__ == '__main__':
+    print(migrate_pickles())
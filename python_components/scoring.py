@@ -0,0 +1,439 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+import httpx
+
+from python_components.code_chunking import CodeChunk, chunk_code, estimate_tokens
+from src.completion_cache import CompletionCache
+
+RATE_PROMPT = '\n\nRate the code from 1 to 10:'
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+SCORING_MODES = ('separate', 'combined')
+COMBINED_PROMPT = '''Review the numbered files below against each of these criteria:
+{criteria}
+
+{files}
+
+Answer with only a JSON object. Its keys are the file numbers, each mapping every \
+criterion name to an object with a "review" string of at most 40 words and an integer \
+"score" from 1 (worst) to 10 (best).
+JSON:'''
+FILE_SECTION = '''File {number}:
+```
+{code}
+```'''
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScoringSettings:
+    base_url: str = 'https://api.openai.com/v1'
+    api_key: Optional[str] = None
+    model: str = 'text-davinci-002'
+    max_tokens: int = 700
+    # Leaves room for max_tokens of review in the second request within a 4k context
+    max_prompt_tokens: int = 2500
+    concurrency: int = 16
+    requests_per_minute: float = 3000
+    burst: int = 20
+    timeout: float = 60
+    max_retries: int = 5
+    backoff: float = 1.0
+    max_backoff: float = 60
+    # separate asks each prompt for a review and then a score, two completions per prompt,
+    # combined asks for every criterion of a batch of files in one json completion
+    mode: str = 'separate'
+    context_tokens: int = 4097
+    batch_size: int = 4
+
+    def __post_init__(self):
+        if self.mode not in SCORING_MODES:
+            raise ValueError(
+                f'Unknown scoring mode {self.mode}, expected one of {SCORING_MODES}'
+            )
+
+
+@dataclass
+class Review:
+    """the review and score of a piece of code and the prompts and answers to save with them
+
+    exceed_len is kept for the saved records, code is chunked to fit the prompt instead of
+    being cut.
+    """
+
+    out_1: str
+    out_2: str
+    fin: str
+    exceed_len: int
+
+    @property
+    def score(self) -> int:
+        return int(re.findall(r'\d+', self.out_2)[0])
+
+
+class TokenBucket:
+    """lets through rate requests per second on average and at most capacity at once"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers['retry-after'])
+    except (KeyError, ValueError):
+        return None
+
+
+class CompletionClient:
+    """completion requests with bounded concurrency, rate limiting, timeouts and retries"""
+
+    def __init__(
+        self,
+        settings: ScoringSettings,
+        client: httpx.AsyncClient,
+        cache: Optional[CompletionCache] = None,
+    ):
+        self.settings = settings
+        self.client = client
+        self.cache = cache
+        self.semaphore = asyncio.Semaphore(settings.concurrency)
+        self.bucket = TokenBucket(settings.requests_per_minute / 60, settings.burst)
+
+    async def request(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        await self.bucket.acquire()
+        try:
+            response = await self.client.post(
+                '/completions',
+                json={
+                    'model': self.settings.model,
+                    'prompt': prompt,
+                    'max_tokens': max_tokens or self.settings.max_tokens,
+                    'temperature': 0.1,
+                    'top_p': 1,
+                },
+                timeout=self.settings.timeout,
+            )
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            raise RetryableError(f'{type(e).__name__}: {e}') from e
+        if response.status_code in RETRY_STATUS_CODES:
+            raise RetryableError(f'status {response.status_code}', retry_after(response))
+        response.raise_for_status()
+        try:
+            return response.json()['choices'][0]['text']
+        except (LookupError, TypeError) as e:
+            raise ValueError(f'The completion response has no text: {e!r}') from e
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """retries with exponential backoff and jitter, honouring retry-after headers"""
+        async with self.semaphore:
+            for attempt in range(self.settings.max_retries + 1):
+                try:
+                    return await self.request(prompt, max_tokens)
+                except RetryableError as e:
+                    if attempt == self.settings.max_retries:
+                        raise
+                    delay = min(
+                        self.settings.max_backoff, self.settings.backoff * 2**attempt
+                    )
+                    await asyncio.sleep(e.retry_after or random.uniform(delay / 2, delay))
+
+    async def cached_complete(
+        self,
+        prompt: str,
+        template: str,
+        code: str,
+        max_tokens: Optional[int] = None,
+        parse: Callable[[str], object] = str,
+    ):
+        """completions are only cached once parse accepts them, and returned parsed"""
+        if self.cache is None:
+            return parse(await self.complete(prompt, max_tokens))
+        key = self.cache.key(self.settings.model, template, code)
+        completion = self.cache.get(key)
+        if completion is not None:
+            return parse(completion)
+        completion = await self.complete(prompt, max_tokens)
+        parsed = parse(completion)
+        self.cache.put(key, completion, self.settings.model, template)
+        return parsed
+
+    async def review(self, prompt: str, code: str) -> Review:
+        """asks for a review of the code and then for a score of the code and review"""
+        in_1 = prompt.format(Code=code)
+        out_1 = await self.cached_complete(in_1, prompt, code)
+        in_2 = in_1 + out_1 + RATE_PROMPT
+        # The score only depends on the code and the review it was asked about
+        out_2 = await self.cached_complete(in_2, prompt + RATE_PROMPT, code + out_1)
+        return Review(out_1, out_2, in_2 + out_2, 0)
+
+    async def review_chunks(self, prompt: str, code: str, chunks: list[CodeChunk]) -> Review:
+        """reviews the chunks of a large file in parallel, a file of one chunk is sent as its
+        compacted text"""
+        if not chunks:
+            chunks = [CodeChunk(1, 1, code)]
+        if len(chunks) == 1:
+            return await self.review(prompt, chunks[0].text)
+        reviews = await asyncio.gather(
+            *(self.review(prompt, chunk.text) for chunk in chunks), return_exceptions=True
+        )
+        return aggregate_reviews(chunks, reviews)
+
+    async def separate_reviews(self, chunk: CodeChunk, prompts: dict) -> dict:
+        reviews = await asyncio.gather(
+            *(self.review(prompt, chunk.text) for prompt in prompts.values()),
+            return_exceptions=True,
+        )
+        return dict(zip(prompts, reviews))
+
+    async def review_batch(self, batch: list[CodeChunk], prompts: dict) -> list[dict]:
+        """every criterion for every chunk of the batch in one completion
+
+        A batch whose answer does not parse is retried one chunk at a time, and a chunk
+        that still fails falls back to the separate prompts.
+        """
+        criteria = criteria_text(prompts)
+        files = '\n\n'.join(
+            FILE_SECTION.format(number=number, code=chunk.text)
+            for number, chunk in enumerate(batch, 1)
+        )
+        prompt = COMBINED_PROMPT.format(criteria=criteria, files=files)
+        try:
+            answers = await self.cached_complete(
+                prompt,
+                COMBINED_PROMPT + criteria,
+                files,
+                max_tokens=self.settings.context_tokens - estimate_tokens(prompt),
+                parse=lambda completion: parse_combined(completion, len(batch), prompts),
+            )
+        except (ValueError, RetryableError, httpx.HTTPError):
+            if len(batch) == 1:
+                return [await self.separate_reviews(batch[0], prompts)]
+            answers = await asyncio.gather(
+                *(self.review_batch([chunk], prompts) for chunk in batch)
+            )
+            return [answer for [answer] in answers]
+        # Each review keeps only its own file and answer, the whole batch prompt would be
+        # saved again with every file and criterion in it
+        return [
+            {
+                criterion: Review(
+                    review,
+                    str(score),
+                    FILE_SECTION.format(number=number, code=chunk.text)
+                    + '\n'
+                    + json.dumps({criterion: {'review': review, 'score': score}}),
+                    0,
+                )
+                for criterion, (review, score) in answer.items()
+            }
+            for number, (chunk, answer) in enumerate(zip(batch, answers), 1)
+        ]
+
+
+def criteria_text(prompts: dict) -> str:
+    """the instructions of each prompt with the code left out"""
+    return '\n'.join(
+        f'- {criterion}: {" ".join(prompt.format(Code="").split())}'
+        for criterion, prompt in prompts.items()
+    )
+
+
+def parse_combined(completion: str, batch_length: int, criteria: Iterable[str]) -> list:
+    """strictly reads a combined answer, raising ValueError for anything missing or invalid"""
+    start, end = completion.find('{'), completion.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError('The completion has no JSON object')
+    answer = json.loads(completion[start : end + 1])
+    if not isinstance(answer, dict):
+        raise ValueError('The completion is not a JSON object')
+    answers = []
+    for number in range(1, batch_length + 1):
+        file_answer = answer.get(str(number))
+        if not isinstance(file_answer, dict):
+            raise ValueError(f'File {number} has no answer')
+        scores = {}
+        for criterion in criteria:
+            entry = file_answer.get(criterion)
+            if not isinstance(entry, dict) or not isinstance(entry.get('review'), str):
+                raise ValueError(f'File {number} has no {criterion} review')
+            score = entry.get('score')
+            if type(score) is not int or not 1 <= score <= 10:
+                raise ValueError(f'File {number} has an invalid {criterion} score')
+            scores[criterion] = (entry['review'], score)
+        answers.append(scores)
+    return answers
+
+
+def batch_chunks(chunks: list[CodeChunk], max_tokens: int, batch_size: int) -> list[list]:
+    """packs consecutive chunks into batches of at most max_tokens and batch_size chunks"""
+    batches, batch, tokens = [], [], 0
+    for chunk in chunks:
+        if batch and (tokens + chunk.tokens > max_tokens or len(batch) == batch_size):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(chunk)
+        tokens += chunk.tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def combined_review_files(
+    completion_client: CompletionClient, files: Iterable[tuple[str, str]], prompts: dict
+) -> dict[tuple[str, str], Review | Exception]:
+    settings = completion_client.settings
+    max_tokens = settings.max_prompt_tokens - estimate_tokens(
+        COMBINED_PROMPT + criteria_text(prompts)
+    )
+    chunks_by_file = {
+        file_id: chunk_code(code, max_tokens=max_tokens) or [CodeChunk(1, 1, code)]
+        for file_id, code in files
+    }
+    chunks = [chunk for file_chunks in chunks_by_file.values() for chunk in file_chunks]
+    batches = batch_chunks(chunks, max_tokens, settings.batch_size)
+    batch_answers = await asyncio.gather(
+        *(completion_client.review_batch(batch, prompts) for batch in batches),
+        return_exceptions=True,
+    )
+    # A batch that failed in a way review_batch does not recover from fails its files only
+    answers = iter(
+        [
+            answer
+            for batch, result in zip(batches, batch_answers)
+            for answer in (
+                [dict.fromkeys(prompts, result)] * len(batch)
+                if isinstance(result, Exception)
+                else result
+            )
+        ]
+    )
+
+    reviews = {}
+    for file_id, file_chunks in chunks_by_file.items():
+        file_answers = [next(answers) for _ in file_chunks]
+        for criterion in prompts:
+            chunk_reviews = [answer[criterion] for answer in file_answers]
+            try:
+                reviews[(file_id, criterion)] = (
+                    chunk_reviews[0]
+                    if len(file_chunks) == 1
+                    else aggregate_reviews(file_chunks, chunk_reviews)
+                )
+            except Exception as e:
+                reviews[(file_id, criterion)] = e
+    return reviews
+
+
+def chunk_score(review: Review | Exception) -> Optional[int]:
+    try:
+        return review.score
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def aggregate_reviews(chunks: list[CodeChunk], reviews: list[Review | Exception]) -> Review:
+    """one review for a file, its score averaged over the chunks weighted by their size"""
+    scored = [
+        (chunk, review, score)
+        for chunk, review in zip(chunks, reviews)
+        if (score := chunk_score(review)) is not None
+    ]
+    if not scored:
+        raise next(
+            (review for review in reviews if isinstance(review, Exception)),
+            ValueError('No chunk of the file was scored'),
+        )
+    weights = sum(chunk.tokens for chunk, _, _ in scored)
+    score = round(sum(chunk.tokens * score for chunk, _, score in scored) / weights)
+    out_1 = '\n'.join(
+        f'Lines {chunk.start_line}-{chunk.end_line}: {review.out_1.strip()}'
+        for chunk, review, _ in scored
+    )
+    fin = '\n\n'.join(review.fin for _, review, _ in scored)
+    return Review(out_1, str(score), fin, 0)
+
+
+async def review_files(
+    files: Iterable[tuple[str, str]],
+    prompts: dict[str, str],
+    settings: ScoringSettings,
+    cache: Optional[CompletionCache] = None,
+) -> dict[tuple[str, str], Review | Exception]:
+    """reviews every (file id, code) pair with every prompt concurrently
+
+    A failed review is returned as its exception, so one file never cancels the others.
+    """
+    headers = (
+        {} if settings.api_key is None else {'Authorization': f'Bearer {settings.api_key}'}
+    )
+    async with httpx.AsyncClient(
+        base_url=settings.base_url,
+        headers=headers,
+        limits=httpx.Limits(max_connections=settings.concurrency),
+    ) as client:
+        completion_client = CompletionClient(settings, client, cache)
+        if settings.mode == 'combined':
+            reviews = await combined_review_files(completion_client, files, prompts)
+        else:
+            reviews = await separate_review_files(completion_client, files, prompts)
+    if cache is not None:
+        logger.info(
+            'Completion cache: %(hits)d hits, %(misses)d misses, hit rate %(hit_rate).2f, '
+            '%(entries)d entries',
+            cache.stats(),
+        )
+    return reviews
+
+
+async def separate_review_files(
+    completion_client: CompletionClient, files: Iterable[tuple[str, str]], prompts: dict
+) -> dict[tuple[str, str], Review | Exception]:
+    settings = completion_client.settings
+    max_tokens = settings.max_prompt_tokens - max(map(estimate_tokens, prompts.values()))
+    keys, reviews = [], []
+    for file_id, code in files:
+        chunks = chunk_code(code, max_tokens=max_tokens)
+        for key, prompt in prompts.items():
+            keys.append((file_id, key))
+            reviews.append(completion_client.review_chunks(prompt, code, chunks))
+    return dict(zip(keys, await asyncio.gather(*reviews, return_exceptions=True)))
+
+
+def score_files(
+    files: Iterable[tuple[str, str]],
+    prompts: dict[str, str],
+    settings: ScoringSettings,
+    cache: Optional[CompletionCache] = None,
+) -> dict[tuple[str, str], Review | Exception]:
+    return asyncio.run(review_files(files, prompts, settings, cache))
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+import threading
+import time
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+from parse_cache import cache_directory
+
+
+def text_hash(text: str) -> str:
+    return sha256(text.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """sqlite cache of llm completions that outlives the process, evicting least recently used
+
+    Completions are keyed by the model, the prompt template and a hash of the code filled
+    into it. A prompt without a template is cached as a template with no code.
+    """
+
+    def __init__(self, path: Optional[str | Path] = None, max_entries: int = 100_000):
+        self.path = Path(path or cache_directory() / 'completions.sqlite3')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS completions ('
+                'key TEXT PRIMARY KEY, model TEXT, template TEXT, completion TEXT, '
+                'created REAL, used REAL)'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS completions_used ON completions (used)'
+            )
+
+    @staticmethod
+    def key(model: str, template: str, code: str = '') -> str:
+        return text_hash(json.dumps([model, text_hash(template), text_hash(code)]))
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                'SELECT completion FROM completions WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Reading an entry makes it the most recently used one
+            self.connection.execute(
+                'UPDATE completions SET used = ? WHERE key = ?', (time.time(), key)
+            )
+            return row[0]
+
+    def put(self, key: str, completion: str, model: str = '', template: str = '') -> None:
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, text_hash(template), completion, now, now),
+            )
+            if self.entries() > self.max_entries:
+                self.evict()
+
+    def entries(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM completions').fetchone()[0]
+
+    def evict(self) -> None:
+        """removes least recently used entries until the cache is back under 80% of its limit"""
+        self.connection.execute(
+            'DELETE FROM completions WHERE key IN '
+            '(SELECT key FROM completions ORDER BY used LIMIT ?)',
+            (self.entries() - int(self.max_entries * 0.8),),
+        )
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'entries': self.entries(),
+            }
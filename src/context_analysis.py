@@ -1,19 +1,28 @@
-from json import loads
+from json import dumps, loads
 
 import openai
 from streamlit import secrets
 
+from completion_cache import CompletionCache
 from generics import try_decorator
 
 # TODO: Replace streamlit secrets with a method that works with FastAPI
 openai.api_key = loads(secrets["openai_key"])['api_key']
+MODEL = "text-davinci-002"
+completion_cache = CompletionCache()
 
 
 @try_decorator
 def get_completion(prompt: str) -> openai.Completion:
-    return openai.Completion.create(
-        model="text-davinci-002", prompt=prompt, max_tokens=700, temperature=0.1, top_p=1
+    key = CompletionCache.key(MODEL, prompt)
+    cached_completion = completion_cache.get(key)
+    if cached_completion is not None:
+        return openai.Completion.construct_from(loads(cached_completion))
+    completion = openai.Completion.create(
+        model=MODEL, prompt=prompt, max_tokens=700, temperature=0.1, top_p=1
     )
+    completion_cache.put(key, dumps(completion), MODEL, prompt)
+    return completion
 
 
 def main():
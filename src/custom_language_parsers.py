@@ -1,3 +1,4 @@
+from bisect import bisect_left
 from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Optional
@@ -10,6 +11,15 @@ class ImportedModule:
     module_base_name: str
     alias: str = None
     imported_objects: list = field(default_factory=list)
+    # Number of leading dots of a relative import, module_base_name is given without them
+    level: int = 0
+
+    def absolute_name(self, module_name: Optional[str]) -> str:
+        """the dotted name of the module, relative imports resolved from the importing one"""
+        if not self.level or module_name is None:
+            return self.module_base_name
+        package = module_name.split('.')[: -self.level]
+        return '.'.join(package + ([self.module_base_name] if self.module_base_name else []))
 
     def __str__(self) -> str:
         if self.alias is None:
@@ -29,16 +39,80 @@ def get_imported_module_for_function_call(
     return None
 
 
+@dataclass
+class ExtractedSyntax:
+    """Everything parse_file needs from a syntax tree, collected in one traversal"""
+
+    function_definitions: list = field(default_factory=list)
+    # Calls inside each function definition, aligned with function_definitions
+    definition_calls: list = field(default_factory=list)
+    function_calls: list = field(default_factory=list)
+    import_captures: list = field(default_factory=list)
+    imported_modules: list = field(default_factory=list)
+    module_call_map: dict = field(default_factory=dict)
+
+
 @dataclass
 class CustomLanguageSyntaxParser:
     name: str = 'python'
     extension: str = 'py'
     parser: object = Optional[object]
     language: object = Optional[object]
+    # Single query capturing @function_definition, @call and the import captures
+    extraction_query: str = ''
+    # Other S-expressions used by the parser, compiled along with the extraction query
+    query_sources: dict = field(default_factory=dict)
+    queries: dict = field(default_factory=dict)
 
     def __post_init__(self):
         self.parser = get_parser(self.name)
         self.language = get_language(self.name)
+        self.queries = self.compile_queries()
+
+    def compile_queries(self) -> dict:
+        """Compiles every query once per language instead of once per parsed file"""
+        query_sources = {'extraction': self.extraction_query, **self.query_sources}
+        return {
+            query_name: self.language.query(query_source)
+            for query_name, query_source in query_sources.items()
+            if query_source
+        }
+
+    def extract(self, tree_node) -> ExtractedSyntax:
+        """Collects definitions, calls and imports with a single query over the tree"""
+        query = self.queries['extraction']
+        syntax = ExtractedSyntax()
+        # Captures come in document order, so enclosing definitions form a stack
+        open_definitions = []
+        for node, capture_name in query.captures(tree_node):
+            while open_definitions and open_definitions[-1][0].end_byte <= node.start_byte:
+                open_definitions.pop()
+            match capture_name:
+                case 'function_definition':
+                    definition_calls = []
+                    syntax.function_definitions.append(node)
+                    syntax.definition_calls.append(definition_calls)
+                    open_definitions.append((node, definition_calls))
+                case 'call':
+                    syntax.function_calls.append(node)
+                    for _, definition_calls in open_definitions:
+                        definition_calls.append(node)
+                case _:
+                    syntax.import_captures.append((node, capture_name))
+        syntax.imported_modules = self.imports_from_captures(syntax.import_captures)
+        syntax.module_call_map = self.call_map_from_syntax(syntax)
+        return syntax
+
+    def imports_from_captures(self, captures) -> list:
+        return []
+
+    def call_map_from_syntax(self, syntax: ExtractedSyntax) -> dict:
+        call_map = defaultdict(list)
+        for definition, calls in zip(syntax.function_definitions, syntax.definition_calls):
+            call_map[self.get_function_name_from_node(definition)] = [
+                self.function_call_to_text(call) for call in calls
+            ]
+        return call_map
 
     def get_function_definitions(self, tree_node) -> list:
         raise NotImplementedError
@@ -56,49 +130,32 @@ class CustomLanguageSyntaxParser:
     def nodes_from_captures(captures):
         return [capture[0] for capture in captures]
 
-    def build_call_graph(
-        self,
-        cur_graph: object,
-        function_definitions: list = None,
-        module_name: str = None,
-        imported_modules: list = None,
-    ) -> object:
-        raise NotImplementedError
-
-    def add_function_to_call_graph(
-        self,
-        function: object,
-        full_graph: object,
+    @staticmethod
+    def qualify_function_call(
+        function_call_name: str,
         module_name: str,
-        function_definition_names: Optional[list] = None,
+        function_definition_names,
         imported_modules: Optional[list] = None,
-    ) -> None:
-
-        function_name = self.get_function_name_from_node(function)
-        function_calls = self.get_calls_in_node(function)
-
-        function_name = module_name + '.' + function_name
-        full_graph.add_node(function_name, content=function.text.decode('ascii'))
-
-        for function_call in function_calls:
-            function_call_name = self.function_call_to_text(function_call)
-            if function_call_name in function_definition_names:
-                function_call_name = module_name + '.' + function_call_name
-            elif imported_modules is not None:
-                matching_imported_module = get_imported_module_for_function_call(
-                    function_call_name, imported_modules
+    ) -> str:
+        """Prefixes a call with the module defining or importing the called function"""
+        if function_call_name in function_definition_names:
+            return module_name + '.' + function_call_name
+        if imported_modules is not None:
+            matching_imported_module = get_imported_module_for_function_call(
+                function_call_name, imported_modules
+            )
+            if matching_imported_module is not None:
+                return (
+                    matching_imported_module.absolute_name(module_name)
+                    + '.'
+                    + function_call_name
                 )
-                if matching_imported_module is not None:
-                    function_call_name = (
-                        matching_imported_module.module_base_name + '.' + function_call_name
-                    )
-
-            full_graph.add_node(function_call_name)
-            full_graph.add_edge(function_name, function_call_name)
+        return function_call_name
 
     @staticmethod
     def get_function_name_from_node(node):
-        raise NotImplementedError
+        name = node.child_by_field_name('name').text.decode('ascii')
+        return name
 
     @staticmethod
     def function_call_to_text(function_call):
@@ -113,11 +170,44 @@ class CustomLanguageSyntaxParser:
         return function_call_text
 
 
+JAVASCRIPT_QUERIES = {
+    'imported_objects': """
+        (object_pattern
+            (shorthand_property_identifier_pattern) @import)
+        """,
+    'import_sources': """
+        (lexical_declaration
+            (variable_declarator
+                (call_expression
+                    (arguments
+                        (string
+                            (string_fragment) @import)))))
+        """,
+    'function_definitions': """
+        (function_declaration) @function_definition
+        """,
+}
+
+
 @dataclass
 class CustomJavascriptSyntaxParser(CustomLanguageSyntaxParser):
     name: str = 'javascript'
     extension: str = 'js'
     call_identifiers: list[str] = field(default_factory=lambda: ['call_expression'])
+    extraction_query: str = """
+        (function_declaration) @function_definition
+        (call_expression
+            function: (member_expression) @call)
+        (object_pattern
+            (shorthand_property_identifier_pattern) @imported_object)
+        (lexical_declaration
+            (variable_declarator
+                (call_expression
+                    (arguments
+                        (string
+                            (string_fragment) @import_source)))))
+        """
+    query_sources: dict = field(default_factory=lambda: dict(JAVASCRIPT_QUERIES))
 
     @staticmethod
     def clean_node_js_import_text(import_text):
@@ -141,7 +231,6 @@ class CustomJavascriptSyntaxParser(CustomLanguageSyntaxParser):
         return imports
 
     def get_node_imports(self, root_node) -> list:
-        imports = []
         # Let's keep this in case we need it later
         # node_imported_module_single = self.language.query(
         #     """
@@ -150,33 +239,30 @@ class CustomJavascriptSyntaxParser(CustomLanguageSyntaxParser):
         #     """
         # )
         # TODO: We might not need inner imports, but let's keep them for now
-        node_imported_modules = self.language.query(
-            """
-            (object_pattern
-                (shorthand_property_identifier_pattern) @import)
-            """
-        )
+        node_imported_modules = self.queries['imported_objects']
         # use arguments to get the name of the module
-        node_module_import_source_query = self.language.query(
-            """
-            (lexical_declaration
-                (variable_declarator
-                    (call_expression
-                        (arguments
-                            (string
-                                (string_fragment) @import)))))
-            """
+        node_module_import_source_query = self.queries['import_sources']
+
+        return self.node_imports(
+            self.nodes_from_captures(node_module_import_source_query.captures(root_node)),
+            self.nodes_from_captures(node_imported_modules.captures(root_node)),
         )
 
-        for import_statement in node_module_import_source_query.captures(root_node):
-            imported_module_name = import_statement[0].text.decode('ascii')
+    def node_imports(self, import_sources: list, imported_objects: list) -> list:
+        imports = []
+        imported_object_starts = [node.start_byte for node in imported_objects]
+        for import_source in import_sources:
+            imported_module_name = import_source.text.decode('ascii')
             imported_module_name = self.clean_node_js_import_text(imported_module_name)
 
-            imported_inner_modules = node_imported_modules.captures(
-                import_statement[0].parent.parent.parent.parent
-            )
+            declaration = import_source.parent.parent.parent.parent
+            imported_inner_modules = imported_objects[
+                bisect_left(imported_object_starts, declaration.start_byte) : bisect_left(
+                    imported_object_starts, declaration.end_byte
+                )
+            ]
             imported_inner_modules = [
-                imported_module[0].text.decode('ascii')
+                imported_module.text.decode('ascii')
                 for imported_module in imported_inner_modules
             ]
 
@@ -188,6 +274,11 @@ class CustomJavascriptSyntaxParser(CustomLanguageSyntaxParser):
             imports.append(imported_module)
         return imports
 
+    def imports_from_captures(self, captures) -> list:
+        import_sources = [node for node, name in captures if name == 'import_source']
+        imported_objects = [node for node, name in captures if name == 'imported_object']
+        return self.node_imports(import_sources, imported_objects)
+
     def get_calls_in_node(self, tree_node) -> list:
         node_calls = []
         for child in tree_node.children:
@@ -200,8 +291,14 @@ class CustomJavascriptSyntaxParser(CustomLanguageSyntaxParser):
         return node_calls
 
     def build_node_call_map(self, tree_node) -> dict:
+        return self.call_map_from_calls(self.get_calls_in_node(tree_node))
+
+    def call_map_from_syntax(self, syntax: ExtractedSyntax) -> dict:
+        return self.call_map_from_calls(syntax.function_calls)
+
+    @staticmethod
+    def call_map_from_calls(calls: list) -> dict:
         call_map = defaultdict(list)
-        calls = self.get_calls_in_node(tree_node)
         for call in calls:
             if call.named_child_count >= 2 and call.named_children[0].named_child_count >= 2:
                 module_name = call.named_children[0].named_children[0].text.decode('ascii')
@@ -210,66 +307,74 @@ class CustomJavascriptSyntaxParser(CustomLanguageSyntaxParser):
         return call_map
 
     def get_function_definitions(self, tree_node) -> list:
-        query_function_definition = self.language.query(
-            """
-            (function_declaration) @function_definition
-            """
-        )
+        query_function_definition = self.queries['function_definitions']
         function_definitions = self.nodes_from_captures(
             query_function_definition.captures(tree_node)
         )
         return function_definitions
 
-    def build_call_graph(
-        self,
-        cur_graph,
-        function_definitions=None,
-        module_name=None,
-        imported_modules=None,
-    ):
-        function_definition_names = [
-            self.get_function_name_from_node(function_definition)
-            for function_definition in function_definitions
-        ]
-        for function_definition in function_definitions:
-            self.add_function_to_call_graph(
-                function=function_definition,
-                full_graph=cur_graph,
-                module_name=module_name,
-                function_definition_names=function_definition_names,
-                imported_modules=imported_modules,
-            )
+
+# TODO: Fix query to only match import_from once, remove dict fix
+PYTHON_IMPORT_QUERY = """
+    (import_from_statement
+        module_name: (dotted_name) @import_from +
+        (dotted_name
+            (identifier) @imported_from
+        )
+    )
+    (import_from_statement
+        module_name: (relative_import) @relative_import)
+    (import_statement
+        (dotted_name) @import_base)
+    (import_statement
+        (aliased_import
+            (dotted_name) @import_base
+            (identifier) @import_alias
+        )
+    )
+    """
+
+PYTHON_QUERIES = {
+    'imports': PYTHON_IMPORT_QUERY,
+    'function_definitions': """
+        (function_definition) @function_definition
+        """,
+    'calls': """
+        (call) @call
+        """,
+    'function_names': """
+        (function_definition
+          name: (identifier) @function.def)
+        """,
+    'identifier_calls': """
+        (call
+        function: (identifier) @function.call)
+        """,
+}
 
 
 @dataclass
 class CustomPythonSyntaxParser(CustomLanguageSyntaxParser):
+    extraction_query: str = (
+        """
+        (function_definition) @function_definition
+        (call) @call
+        """
+        + PYTHON_IMPORT_QUERY
+    )
+    query_sources: dict = field(default_factory=lambda: dict(PYTHON_QUERIES))
+
     def get_function_name_from_node(self, node):
         name = node.named_children[0].text.decode('ascii')
         return name
 
     def get_imports(self, tree_node) -> list[ImportedModule]:
+        query_import = self.queries['imports']
+        return self.imports_from_captures(query_import.captures(tree_node))
+
+    def imports_from_captures(self, captures) -> list[ImportedModule]:
         imported_modules = {}
-        # TODO: Fix query to only match import_from once, remove dict fix
-        query_import = self.language.query(
-            """
-            (import_from_statement
-                (dotted_name) @import_from +
-                (dotted_name
-                    (identifier) @imported_from
-                )
-            )
-            (import_statement
-                (dotted_name) @import_base)
-            (import_statement
-                (aliased_import
-                    (dotted_name) @import_base
-                    (identifier) @import_alias
-                )
-            )
-            """
-        )
-        import_captures = query_import.captures(tree_node)
-        import_iter = iter(import_captures)
+        import_iter = iter(captures)
         last_key = ''
         for import_obj in import_iter:
             import_type = import_obj[1]
@@ -286,44 +391,51 @@ class CustomPythonSyntaxParser(CustomLanguageSyntaxParser):
                     imported_modules[last_key].imported_objects.append(obj_name)
                 case 'import_alias':
                     imported_modules[last_key].alias = obj_name
+                case 'relative_import':
+                    imported_module = imported_modules.setdefault(
+                        obj_name, self.relative_import(import_obj[0])
+                    )
+                    imported_module.imported_objects += self.imported_names(
+                        import_obj[0].parent
+                    )
 
         imported_modules = list(imported_modules.values())
         return imported_modules
 
-    def get_function_definitions(self, tree_node) -> list:
-        query_function_definition = self.language.query(
-            """
-            (function_definition) @function_definition
-            """
+    @staticmethod
+    def relative_import(relative_import_node) -> ImportedModule:
+        prefix, *module_name = relative_import_node.named_children
+        return ImportedModule(
+            module_base_name=module_name[0].text.decode('ascii') if module_name else '',
+            imported_objects=[],
+            level=len(prefix.text),
         )
+
+    @staticmethod
+    def imported_names(import_from_node) -> list[str]:
+        """the names a from import binds the imported objects to"""
+        names = []
+        for name in import_from_node.children_by_field_name('name'):
+            if name.type == 'aliased_import':
+                name = name.child_by_field_name('name')
+            names.append(name.text.decode('ascii'))
+        return names
+
+    def get_function_definitions(self, tree_node) -> list:
+        query_function_definition = self.queries['function_definitions']
         function_definitions = self.nodes_from_captures(
             query_function_definition.captures(tree_node)
         )
         return function_definitions
 
     def get_calls_in_node(self, tree_node) -> list:
-        query_call = self.language.query(
-            """
-            (call) @call
-            """
-        )
+        query_call = self.queries['calls']
         node_calls = self.nodes_from_captures(query_call.captures(tree_node))
         return node_calls
 
     def build_node_call_map(self, tree_node) -> dict:
-        fun_def_query = self.language.query(
-            """
-            (function_definition
-              name: (identifier) @function.def)
-
-            """
-        )
-        fun_call_query = self.language.query(
-            """
-            (call
-            function: (identifier) @function.call)
-            """
-        )
+        fun_def_query = self.queries['function_names']
+        fun_call_query = self.queries['identifier_calls']
 
         fun_definitions = fun_def_query.captures(tree_node)
         call_map = defaultdict(list)
@@ -335,25 +447,92 @@ class CustomPythonSyntaxParser(CustomLanguageSyntaxParser):
             ]
         return call_map
 
-    def build_call_graph(
-        self,
-        cur_graph,
-        function_definitions=None,
-        module_name=None,
-        imported_modules=None,
-    ):
-        function_definition_names = [
-            self.get_function_name_from_node(function_definition)
-            for function_definition in function_definitions
-        ]
-        for function_definition in function_definitions:
-            self.add_function_to_call_graph(
-                function=function_definition,
-                full_graph=cur_graph,
-                module_name=module_name,
-                function_definition_names=function_definition_names,
-                imported_modules=imported_modules,
-            )
+    def call_map_from_syntax(self, syntax: ExtractedSyntax) -> dict:
+        call_map = defaultdict(list)
+        for definition, calls in zip(syntax.function_definitions, syntax.definition_calls):
+            called_functions = [call.child_by_field_name('function') for call in calls]
+            call_map[definition.child_by_field_name('name').text.decode('ascii')] = [
+                called_function.text.decode('ascii')
+                for called_function in called_functions
+                if called_function.type == 'identifier'
+            ]
+        return call_map
+
+
+def scoped_name_to_text(node, scopes: dict) -> str:
+    """The dotted name of a callee, scopes maps node types to their scope and name fields"""
+    if node.type not in scopes:
+        return node.text.decode('ascii')
+    scope_field, name_field = scopes[node.type]
+    name = scoped_name_to_text(node.child_by_field_name(name_field), scopes)
+    scope = node.child_by_field_name(scope_field) if scope_field else None
+    if scope is None:
+        return name
+    return scoped_name_to_text(scope, scopes) + '.' + name
+
+
+# Scope and name fields of the nodes a called function is named by, generics are named
+# without their type arguments
+CSHARP_CALLEE_SCOPES = {
+    'member_access_expression': ('expression', 'name'),
+    'generic_name': (None, 'name'),
+}
+RUST_CALLEE_SCOPES = {
+    'scoped_identifier': ('path', 'name'),
+    'field_expression': ('value', 'field'),
+    'generic_function': (None, 'function'),
+}
+
+
+@dataclass
+class CustomCSharpSyntaxParser(CustomLanguageSyntaxParser):
+    name: str = 'c_sharp'
+    extension: str = 'cs'
+    extraction_query: str = """
+        (method_declaration) @function_definition
+        (invocation_expression) @call
+        """
+
+    @staticmethod
+    def function_call_to_text(function_call):
+        return scoped_name_to_text(
+            function_call.child_by_field_name('function'), CSHARP_CALLEE_SCOPES
+        )
+
+
+@dataclass
+class CustomJavaSyntaxParser(CustomLanguageSyntaxParser):
+    name: str = 'java'
+    extension: str = 'java'
+    extraction_query: str = """
+        (method_declaration) @function_definition
+        (method_invocation) @call
+        """
+
+    @staticmethod
+    def function_call_to_text(function_call):
+        # The called method is the name field, the object it is called on is left as it is
+        name = function_call.child_by_field_name('name').text.decode('ascii')
+        called_object = function_call.child_by_field_name('object')
+        if called_object is None:
+            return name
+        return called_object.text.decode('ascii') + '.' + name
+
+
+@dataclass
+class CustomRustSyntaxParser(CustomLanguageSyntaxParser):
+    name: str = 'rust'
+    extension: str = 'rs'
+    extraction_query: str = """
+        (function_item) @function_definition
+        (call_expression) @call
+        """
+
+    @staticmethod
+    def function_call_to_text(function_call):
+        return scoped_name_to_text(
+            function_call.child_by_field_name('function'), RUST_CALLEE_SCOPES
+        )
 
 
 PythonSyntaxParser = CustomPythonSyntaxParser(
@@ -366,17 +545,17 @@ JavascriptSyntaxParser = CustomJavascriptSyntaxParser(
     extension='js',
 )
 
-CSharpSyntaxParser = CustomLanguageSyntaxParser(
+CSharpSyntaxParser = CustomCSharpSyntaxParser(
     name='c_sharp',
     extension='cs',
 )
 
-JavaSyntaxParser = CustomLanguageSyntaxParser(
+JavaSyntaxParser = CustomJavaSyntaxParser(
     name='java',
     extension='java',
 )
 
-RustSyntaxParser = CustomLanguageSyntaxParser(
+RustSyntaxParser = CustomRustSyntaxParser(
     name='rust',
     extension='rs',
 )
@@ -0,0 +1,78 @@
+import io
+import tarfile
+from typing import BinaryIO, Callable, Iterator, Optional
+
+import httpx
+
+from github_trees import API_URL, BlobFile, is_supported_file, request_headers
+from parse_cache import blob_sha
+
+
+def archive_url(repository: str, ref: Optional[str] = None, api_url: str = API_URL) -> str:
+    """tarball of a ref, or of the default branch when no ref is given"""
+    url = f'{api_url}/repos/{repository}/tarball'
+    return url if ref is None else f'{url}/{ref}'
+
+
+class ChunkReader(io.RawIOBase):
+    """a read only file over an iterator of byte chunks, such as a streamed response body"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def archive_files(
+    stream: BinaryIO,
+    include: Callable[[str], bool] = is_supported_file,
+    max_size: Optional[int] = None,
+) -> Iterator[BlobFile]:
+    """reads a gzipped tarball member by member from a stream, nothing is extracted to disk"""
+    with tarfile.open(fileobj=stream, mode='r|gz') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            # Members are inside a single <owner>-<name>-<commit> directory
+            path = member.name.split('/', 1)[-1]
+            if not include(path) or (max_size is not None and member.size > max_size):
+                continue
+            content = archive.extractfile(member).read()
+            yield BlobFile(
+                path=path, sha=blob_sha(content), size=member.size, decoded_content=content
+            )
+
+
+def archive_file_list(
+    repository_link: str,
+    ref: Optional[str] = None,
+    token: Optional[str] = None,
+    api_url: str = API_URL,
+    include: Callable[[str], bool] = is_supported_file,
+    max_size: Optional[int] = None,
+) -> Iterator[BlobFile]:
+    """downloads a repository in a single request and lazily yields its supported files"""
+    repository = repository_link.removeprefix('https://github.com/')
+    # The api redirects to the archive on codeload.github.com
+    with httpx.stream(
+        'GET',
+        archive_url(repository, ref, api_url),
+        headers=request_headers(token),
+        follow_redirects=True,
+        timeout=30,
+    ) as response:
+        response.raise_for_status()
+        yield from archive_files(ChunkReader(response.iter_bytes()), include, max_size)
@@ -10,11 +10,17 @@ from streamlit import secrets
 from streamlit.runtime.secrets import Secrets
 from toolz.functoolz import pipe
 
+from files_from_archive import archive_file_list
 from generics import call_on_input, try_decorator
+from github_trees import BlobFile, commit_sha, fetch_file_list
+
+
+def github_token(secret: Secrets = secrets) -> str:
+    return pipe(secret['github_token'], loads, lambda tokens: tokens['secondary'])
 
 
 def github_hooks(secret: Secrets = secrets) -> Github:
-    return pipe(secret['github_token'], loads, lambda tokens: tokens['secondary'], Github)
+    return pipe(secret, github_token, Github)
 
 
 @try_decorator
@@ -63,3 +69,22 @@ def get_files(repository_link: str) -> Iterator[ContentFile | None]:
 def file_list(repository_link: str) -> List[ContentFile]:
     """Returns an empty list if the repository link is empty"""
     return pipe(repository_link, get_files, list)
+
+
+def tree_file_list(repository_link: str, ref: str = 'HEAD') -> List[BlobFile]:
+    """Lists the repository tree in one request and downloads supported files concurrently"""
+    return fetch_file_list(
+        repository_link.removeprefix('https://github.com/'), ref=ref, token=github_token()
+    )
+
+
+def tarball_file_list(repository_link: str, ref: str = 'HEAD') -> List[BlobFile]:
+    """Downloads the repository as one tarball and keeps its supported files"""
+    return list(archive_file_list(repository_link, ref=ref, token=github_token()))
+
+
+def head_commit(repository_link: str) -> str:
+    """Returns the SHA of the latest commit on the default branch"""
+    return commit_sha(
+        repository_link.removeprefix('https://github.com/'), token=github_token()
+    )
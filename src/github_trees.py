@@ -0,0 +1,131 @@
+import asyncio
+from base64 import b64decode
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import httpx
+
+from custom_language_parsers import LANGUAGES
+
+API_URL = 'https://api.github.com'
+
+
+@dataclass
+class BlobFile:
+    """a file of a repository tree, read by build_graphs_for_project like a ContentFile"""
+
+    path: str
+    sha: str
+    size: int
+    decoded_content: Optional[bytes] = None
+
+
+def is_supported_file(path: str) -> bool:
+    return Path(path).suffix[1:] in LANGUAGES
+
+
+def request_headers(token: Optional[str] = None) -> dict:
+    headers = {'Accept': 'application/vnd.github+json'}
+    if token is not None:
+        headers['Authorization'] = f'token {token}'
+    return headers
+
+
+async def fetch_tree(client: httpx.AsyncClient, repository: str, tree_sha: str) -> list[dict]:
+    """lists every blob of a tree with one recursive git trees call"""
+    response = await client.get(
+        f'/repos/{repository}/git/trees/{tree_sha}', params={'recursive': '1'}
+    )
+    response.raise_for_status()
+    tree = response.json()
+    if not tree.get('truncated'):
+        return [entry for entry in tree['tree'] if entry['type'] == 'blob']
+
+    # Too large for a single response, list the top level and fetch each subtree recursively
+    response = await client.get(f'/repos/{repository}/git/trees/{tree_sha}')
+    response.raise_for_status()
+    entries = response.json()['tree']
+    subtrees = [entry for entry in entries if entry['type'] == 'tree']
+    subtree_blobs = await asyncio.gather(
+        *(fetch_tree(client, repository, subtree['sha']) for subtree in subtrees)
+    )
+    blobs = [entry for entry in entries if entry['type'] == 'blob']
+    for subtree, blobs_in_subtree in zip(subtrees, subtree_blobs):
+        blobs += [
+            {**entry, 'path': f"{subtree['path']}/{entry['path']}"}
+            for entry in blobs_in_subtree
+        ]
+    return blobs
+
+
+async def fetch_commit_sha(
+    client: httpx.AsyncClient, repository: str, ref: str = 'HEAD'
+) -> str:
+    """resolves a ref to a commit SHA without downloading the commit itself"""
+    response = await client.get(
+        f'/repos/{repository}/commits/{ref}', headers={'Accept': 'application/vnd.github.sha'}
+    )
+    response.raise_for_status()
+    return response.text.strip()
+
+
+async def fetch_blob(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, repository: str, entry: dict
+) -> BlobFile:
+    async with semaphore:
+        response = await client.get(f"/repos/{repository}/git/blobs/{entry['sha']}")
+    response.raise_for_status()
+    return BlobFile(
+        path=entry['path'],
+        sha=entry['sha'],
+        size=entry.get('size', 0),
+        decoded_content=b64decode(response.json()['content']),
+    )
+
+
+async def fetch_files(
+    repository: str,
+    ref: str = 'HEAD',
+    token: Optional[str] = None,
+    api_url: str = API_URL,
+    concurrency: int = 32,
+    include: Callable[[str], bool] = is_supported_file,
+) -> list[BlobFile]:
+    """lists the tree of a repository once and downloads the included blobs concurrently"""
+    async with httpx.AsyncClient(
+        base_url=api_url,
+        headers=request_headers(token),
+        limits=httpx.Limits(max_connections=concurrency),
+        timeout=30,
+    ) as client:
+        entries = await fetch_tree(client, repository, ref)
+        semaphore = asyncio.Semaphore(concurrency)
+        return list(
+            await asyncio.gather(
+                *(
+                    fetch_blob(client, semaphore, repository, entry)
+                    for entry in entries
+                    if include(entry['path'])
+                )
+            )
+        )
+
+
+def fetch_file_list(repository: str, **kwargs) -> list[BlobFile]:
+    """repository is given as owner/name, keyword arguments are passed to fetch_files"""
+    return asyncio.run(fetch_files(repository, **kwargs))
+
+
+async def resolve_commit(
+    repository: str, ref: str = 'HEAD', token: Optional[str] = None, api_url: str = API_URL
+) -> str:
+    async with httpx.AsyncClient(
+        base_url=api_url, headers=request_headers(token), timeout=30
+    ) as client:
+        return await fetch_commit_sha(client, repository, ref)
+
+
+def commit_sha(repository: str, **kwargs) -> str:
+    """repository is given as owner/name, keyword arguments are passed to resolve_commit"""
+    return asyncio.run(resolve_commit(repository, **kwargs))
@@ -0,0 +1,164 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from typing import Optional
+
+import networkx as nx
+
+from vis_payload import vis_node
+
+CLUSTER_PREFIX = 'cluster:'
+# Calls to functions the project does not define are grouped under this top level cluster
+EXTERNAL = '(external)'
+# Memory a tree and the graph it keeps take per node and per edge, measured with tracemalloc
+# on a few packages, the source text of functions comes on top
+NODE_BYTES = 650
+EDGE_BYTES = 250
+
+
+def hierarchy_key(node: str, attributes: dict) -> tuple[str, ...]:
+    """the packages, module and classes a function is in, then its own name"""
+    parts = tuple(str(node).split('.'))
+    return parts if 'filepath' in attributes else (EXTERNAL, *parts)
+
+
+def cluster_id(prefix: tuple[str, ...]) -> str:
+    return CLUSTER_PREFIX + '.'.join(prefix)
+
+
+def item_id(item) -> str:
+    return cluster_id(item) if isinstance(item, tuple) else item
+
+
+class ClusterTree:
+    """the nodes of a function call graph grouped into nested clusters by package and module
+
+    A view of the graph is a set of items, each either a cluster, given by the prefix of
+    hierarchy keys it holds, or a node of the graph. Edges between nodes are rolled up to
+    the items of a view that contain them.
+    """
+
+    def __init__(self, graph: nx.DiGraph):
+        self.graph = graph
+        self.keys = {
+            node: hierarchy_key(node, attributes)
+            for node, attributes in graph.nodes(data=True)
+        }
+        self.child_clusters = defaultdict(set)
+        self.leaves = defaultdict(list)
+        # Number of nodes below every cluster
+        self.sizes = Counter()
+        self.clusters = {}
+        for node, key in self.keys.items():
+            self.leaves[key[:-1]].append(node)
+            for depth in range(len(key)):
+                prefix = key[:depth]
+                self.sizes[prefix] += 1
+                self.clusters[cluster_id(prefix)] = prefix
+                if depth:
+                    self.child_clusters[key[: depth - 1]].add(prefix)
+        # An estimate in bytes, the graph is not changed once it is clustered
+        self.size = (
+            NODE_BYTES * graph.number_of_nodes()
+            + EDGE_BYTES * graph.number_of_edges()
+            + sum(len(content) for _, content in graph.nodes(data='content', default=''))
+        )
+
+    def children(self, prefix: tuple[str, ...]) -> list:
+        """the clusters and nodes directly inside a cluster, largest clusters first"""
+        clusters = sorted(self.child_clusters[prefix], key=lambda child: -self.sizes[child])
+        return clusters + sorted(self.leaves[prefix])
+
+    def level_of_detail(self, node_budget: int) -> set:
+        """a view expanding the largest clusters first while it has at most node_budget items
+
+        The top level clusters are always shown, even when there are more of them.
+        """
+        view = set(self.children(()))
+        clusters = [(-self.sizes[item], item) for item in view if isinstance(item, tuple)]
+        heapq.heapify(clusters)
+        while clusters:
+            _, prefix = heapq.heappop(clusters)
+            children = self.children(prefix)
+            if len(view) - 1 + len(children) > node_budget:
+                continue
+            view.remove(prefix)
+            view.update(children)
+            for child in children:
+                if isinstance(child, tuple):
+                    heapq.heappush(clusters, (-self.sizes[child], child))
+        return view
+
+    def item_in(self, node: str, view: set):
+        """the item of the view that holds a node, None when the view does not show it"""
+        key = self.keys[node]
+        for depth in range(1, len(key)):
+            if key[:depth] in view:
+                return key[:depth]
+        return node if node in view else None
+
+    def vis_item(self, item) -> dict:
+        if not isinstance(item, tuple):
+            node_data = vis_node(item, self.graph.nodes[item])
+            if 'label' not in self.graph.nodes[item]:
+                # Inside its cluster a function is labelled with its own name only
+                node_data['label'] = self.keys[item][-1]
+            return node_data
+        size = self.sizes[item]
+        return {
+            'id': cluster_id(item),
+            'label': item[-1],
+            'title': f'{size} function{"s" if size > 1 else ""}',
+            'shape': 'box',
+            'size': round(10 + 4 * math.log2(size), 1),
+        }
+
+    def vis_edges(self, view: set, shown: Optional[set] = None) -> list[dict]:
+        """edges between the items of a view, counting the calls each of them stands for
+
+        Only edges with an end in shown are kept when it is given.
+        """
+        calls = Counter()
+        for source, target in self.graph.edges:
+            source_item, target_item = self.item_in(source, view), self.item_in(target, view)
+            if source_item is None or target_item is None or source_item == target_item:
+                continue
+            if shown is None or source_item in shown or target_item in shown:
+                calls[source_item, target_item] += 1
+        edges = []
+        for (source_item, target_item), count in calls.items():
+            edge = {'from': item_id(source_item), 'to': item_id(target_item)}
+            if count > 1:
+                edge['value'] = count
+                edge['title'] = f'{count} calls'
+            edges.append(edge)
+        return edges
+
+    def vis_data(self, view: set) -> dict:
+        return {
+            'nodes': [self.vis_item(item) for item in view],
+            'edges': self.vis_edges(view),
+        }
+
+    def expand(self, cluster: str, node_budget: int, offset: int = 0) -> Optional[dict]:
+        """node_budget children of a cluster from offset on and their edges, None if unknown
+
+        Nodes outside the cluster are rolled up to the siblings of the cluster and of each
+        cluster it is in, which is what a view expanded down to the cluster shows. Edges to
+        children left for a later offset point to nodes that are not sent yet. The number
+        of children after the ones sent is given as more.
+        """
+        prefix = self.clusters.get(cluster)
+        if prefix is None:
+            return None
+        children = self.children(prefix)
+        shown = children[offset : offset + node_budget]
+        view = set(children)
+        for depth in range(len(prefix)):
+            view.update(self.children(prefix[:depth]))
+            view.discard(prefix[: depth + 1])
+        return {
+            'nodes': [self.vis_item(item) for item in shown],
+            'edges': self.vis_edges(view, shown=set(shown)),
+            'more': max(0, len(children) - offset - node_budget),
+        }
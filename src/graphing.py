@@ -1,73 +1,378 @@
 # import pickle
 import logging
+import sys
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 
 import networkx as nx
 from pyvis.network import Network
 
 from custom_language_parsers import LANGUAGES
+from parse_cache import blob_sha
+from vis_payload import vis_data
 
+# Modules that are imported by the name of the directory they are in
+PACKAGE_MODULE_NAMES = ('__init__', 'index')
 
-@dataclass
+
+# Fields per record in the ParsedFile arrays
+DEFINITION_FIELDS = 4  # name, qualified name, start byte, end byte
+CALL_FIELDS = 3  # name, start byte, end byte
+CALL_EDGE_FIELDS = 2  # caller definition, callee name
+
+
+@dataclass(slots=True)
 class ParsedFile:
+    """Names and byte spans of a parsed file, no syntax tree or graph is kept alive.
+    Every name in the arrays is an index into the interned names list."""
+
     filepath: Path
     language_name: str
     imported_modules: list
-    function_definitions: list
-    function_calls: list
     module_call_map: dict
-    local_call_graph: nx.DiGraph
+    names: list
+    definitions: array
+    calls: array
+    call_edges: array
     project_connections: list = None  # on file level
 
+    @property
+    def function_definitions(self):
+        return [
+            self.names[name_index] for name_index in self.definitions[::DEFINITION_FIELDS]
+        ]
+
+    @property
+    def function_calls(self):
+        return [self.names[name_index] for name_index in self.calls[::CALL_FIELDS]]
+
+    @property
+    def local_call_graph(self):
+        local_call_graph = nx.DiGraph()
+        self.add_call_graph_to(local_call_graph)
+        return local_call_graph
+
+    def add_call_graph_to(self, graph):
+        """Adds nodes and edges in the same order building the local call graph used to"""
+        filepath = str(self.filepath)
+        call_edge_index = 0
+        for definition_index in range(len(self.definitions) // DEFINITION_FIELDS):
+            _, qualified_name_index, start_byte, end_byte = self.definitions[
+                definition_index
+                * DEFINITION_FIELDS : (definition_index + 1)
+                * DEFINITION_FIELDS
+            ]
+            function_name = self.names[qualified_name_index]
+            graph.add_node(function_name, filepath=filepath, span=(start_byte, end_byte))
+            while (
+                call_edge_index < len(self.call_edges)
+                and self.call_edges[call_edge_index] == definition_index
+            ):
+                function_call_name = self.names[self.call_edges[call_edge_index + 1]]
+                graph.add_node(function_call_name)
+                graph.add_edge(function_name, function_call_name)
+                call_edge_index += CALL_EDGE_FIELDS
+
+
+class NameTable:
+    """Interned names of a file, each stored once and referred to by index"""
+
+    def __init__(self):
+        self.names = []
+        self.indices = {}
+
+    def index(self, name):
+        if name not in self.indices:
+            self.indices[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return self.indices[name]
+
+
+def compact_call_graph(custom_language_parser, syntax, module_name, name_table):
+    function_definition_names = [
+        custom_language_parser.get_function_name_from_node(function_definition)
+        for function_definition in syntax.function_definitions
+    ]
+    defined_names = set(function_definition_names)
+    definitions = array('I')
+    call_edges = array('I')
+    for definition_index, (function_definition, function_calls) in enumerate(
+        zip(syntax.function_definitions, syntax.definition_calls)
+    ):
+        function_name = function_definition_names[definition_index]
+        definitions.extend(
+            (
+                name_table.index(function_name),
+                name_table.index(f'{module_name}.{function_name}'),
+                function_definition.start_byte,
+                function_definition.end_byte,
+            )
+        )
+        called_names = set()
+        for function_call in function_calls:
+            function_call_name = custom_language_parser.qualify_function_call(
+                custom_language_parser.function_call_to_text(function_call),
+                module_name,
+                defined_names,
+                syntax.imported_modules,
+            )
+            if function_call_name not in called_names:
+                called_names.add(function_call_name)
+                call_edges.extend((definition_index, name_table.index(function_call_name)))
+    return definitions, call_edges
+
 
 def parse_file(filepath, file_bytes=None, module_name=None):
     # Get the language name from the file extension
     # TODO: Add error handling for unsupported languages
     custom_language_parser = LANGUAGES[filepath.suffix[1:]]
     if file_bytes is None:
-        file_bytes = bytes(open(filepath, 'r').read(), 'utf-8')
+        file_bytes = read_file_bytes(filepath)
     # Parse the file
     tree = custom_language_parser.parser.parse(file_bytes)
-    local_call_graph = nx.DiGraph()
-    # TODO: Traverse the tree only once
-    module_call_map = custom_language_parser.build_node_call_map(tree.root_node)  # noqa
-    function_definitions = custom_language_parser.get_function_definitions(tree.root_node)
-    function_calls = custom_language_parser.get_calls_in_node(tree.root_node)
-    imported_modules = custom_language_parser.get_imports(tree.root_node)
-    custom_language_parser.build_call_graph(
-        local_call_graph,
-        function_definitions,
-        module_name,
-        imported_modules,
+    syntax = custom_language_parser.extract(tree.root_node)
+    name_table = NameTable()
+    definitions, call_edges = compact_call_graph(
+        custom_language_parser, syntax, module_name, name_table
     )
+    calls = array('I')
+    for function_call in syntax.function_calls:
+        calls.extend(
+            (
+                name_table.index(custom_language_parser.function_call_to_text(function_call)),
+                function_call.start_byte,
+                function_call.end_byte,
+            )
+        )
 
     parsed_file = ParsedFile(
         filepath=filepath,
         language_name=custom_language_parser.name,
-        imported_modules=imported_modules,
-        function_definitions=function_definitions,
-        function_calls=function_calls,
-        module_call_map=module_call_map,
-        local_call_graph=local_call_graph,
+        imported_modules=syntax.imported_modules,
+        module_call_map={
+            sys.intern(function_name): [sys.intern(call_name) for call_name in call_names]
+            for function_name, call_names in syntax.module_call_map.items()
+        },
+        names=name_table.names,
+        definitions=definitions,
+        calls=calls,
+        call_edges=call_edges,
     )
     return parsed_file
 
 
-def parsed_file_is_imported(imported_modules, parsed_file):
-    filepath_stem = parsed_file.filepath.stem
+def read_file_bytes(filepath):
+    return bytes(open(filepath, 'r').read(), 'utf-8')
+
+
+def parsed_file_from_cache(
+    parse_cache, filepath, get_file_bytes, module_name=None, file_sha=None
+):
+    """Looks a file up in the cache, also returns the cache key and any bytes read to hash it"""
+    file_bytes = None
+    if file_sha is None:
+        file_bytes = get_file_bytes()
+        file_sha = blob_sha(file_bytes)
+    key = parse_cache.key(file_sha, filepath.suffix, module_name)
+    parsed_file = parse_cache.get(key)
+    if parsed_file is not None:
+        parsed_file.filepath = filepath
+    return parsed_file, key, file_bytes
+
+
+def parse_file_with_cache(
+    parse_cache, filepath, get_file_bytes, module_name=None, file_sha=None
+):
+    if parse_cache is None:
+        return parse_file(filepath, file_bytes=get_file_bytes(), module_name=module_name)
+    parsed_file, key, file_bytes = parsed_file_from_cache(
+        parse_cache, filepath, get_file_bytes, module_name, file_sha
+    )
+    if parsed_file is None:
+        if file_bytes is None:
+            file_bytes = get_file_bytes()
+        parsed_file = parse_file(filepath, file_bytes=file_bytes, module_name=module_name)
+        parse_cache.put(key, parsed_file)
+    return parsed_file
+
+
+def parse_files_in_parallel(source_files, parse_cache, workers, executor=None):
+    """Parses files over a process pool, parsed files are compact enough to send back whole
+
+    A pool of workers processes is started for the call unless an executor is given.
+    """
+    parsed_files = {}
+    jobs = []
+    for filename, filepath, module_name, get_file_bytes, file_sha in source_files:
+        key = file_bytes = None
+        if parse_cache is not None:
+            parsed_file, key, file_bytes = parsed_file_from_cache(
+                parse_cache, filepath, get_file_bytes, module_name, file_sha
+            )
+            if parsed_file is not None:
+                parsed_files[filename] = parsed_file
+                continue
+        if file_bytes is None:
+            file_bytes = get_file_bytes()
+        # Reserve the slot so files keep their order in the graphs
+        parsed_files[filename] = None
+        jobs.append((filename, key, filepath, file_bytes, module_name))
+    if not jobs:
+        return parsed_files
+
+    filenames, keys, filepaths, file_contents, module_names = zip(*jobs)
+    pool = (
+        ProcessPoolExecutor(max_workers=workers)
+        if executor is None
+        else nullcontext(executor)
+    )
+    with pool as executor:
+        parsed = executor.map(
+            parse_file,
+            filepaths,
+            file_contents,
+            module_names,
+            chunksize=max(1, len(jobs) // (workers * 4)),
+        )
+        for filename, key, parsed_file in zip(filenames, keys, parsed):
+            if key is not None:
+                parse_cache.put(key, parsed_file)
+            parsed_files[filename] = parsed_file
+    return parsed_files
+
+
+def module_paths_from_filename(filename):
+    """Every dotted suffix a file can be imported by, packages are named after their directory"""
+    parts = list(Path(filename).with_suffix('').parts)
+    if len(parts) > 1 and parts[-1] in PACKAGE_MODULE_NAMES:
+        parts.pop()
+    return ['.'.join(parts[i:]) for i in range(len(parts))]
+
+
+def module_name_from_filename(filename):
+    """The full dotted name of a file, the root of an absolute path left out"""
+    path = Path(filename)
+    parts = [part for part in path.with_suffix('').parts if part != path.anchor]
+    if len(parts) > 1 and parts[-1] in PACKAGE_MODULE_NAMES:
+        parts.pop()
+    return '.'.join(parts)
+
+
+def relative_module_paths(imported_module, importer):
+    """Full dotted names a relative import in the importer can refer to, resolved against
+    the package of the importer"""
+    package = [part for part in Path(importer).parent.parts if part != Path(importer).anchor]
+    if imported_module.level - 1 > len(package):
+        return []
+    parts = package[: len(package) - imported_module.level + 1]
+    if imported_module.module_base_name:
+        parts += imported_module.module_base_name.split('.')
+    module_path = '.'.join(parts)
+    object_paths = [
+        f'{module_path}.{imported_object}' if module_path else imported_object
+        for imported_object in imported_module.imported_objects
+    ]
+    return ([module_path] if module_path else []) + object_paths
+
+
+def module_path_from_import(module_base_name):
+    for extension in LANGUAGES:
+        module_base_name = module_base_name.removesuffix(f'.{extension}')
+    return module_base_name.replace('/', '.').strip('.')
+
+
+def import_lookup_keys(imported_module):
+    """Module name parts (matched against file stems) and dotted paths an import can refer to"""
+    module_name_parts = imported_module.module_base_name.split('.')
+    module_path = module_path_from_import(imported_module.module_base_name)
+    module_paths = [module_path] + [
+        f'{module_path}.{imported_object}'
+        for imported_object in imported_module.imported_objects or []
+    ]
+    return module_name_parts, module_paths
+
+
+class ModuleIndex:
+    """Resolves imports with dict lookups instead of comparing every pair of files"""
+
+    def __init__(self, parsed_files=None):
+        self.files_by_stem = defaultdict(set)
+        self.files_by_module_path = defaultdict(set)
+        for filename in parsed_files or {}:
+            self.add(filename)
+
+    def add(self, filename):
+        self.files_by_stem[Path(filename).stem].add(filename)
+        for module_path in module_paths_from_filename(filename):
+            self.files_by_module_path[module_path].add(filename)
+
+    def remove(self, filename):
+        keys = [(self.files_by_stem, Path(filename).stem)] + [
+            (self.files_by_module_path, module_path)
+            for module_path in module_paths_from_filename(filename)
+        ]
+        for files_by_key, key in keys:
+            files_by_key[key].discard(filename)
+            if not files_by_key[key]:
+                del files_by_key[key]
+
+    def resolve_relative(self, imported_module, importer):
+        imported_files = set()
+        for module_path in relative_module_paths(imported_module, importer):
+            imported_files |= {
+                filename
+                for filename in self.files_by_module_path.get(module_path, set())
+                if module_name_from_filename(filename) == module_path
+            }
+        return imported_files
+
+    def resolve(self, imported_modules, importer=None):
+        """Files the imports refer to, relative imports only resolve given the importer"""
+        imported_files = set()
+        for imported_module in imported_modules:
+            if imported_module.level:
+                if importer is not None:
+                    imported_files |= self.resolve_relative(imported_module, importer)
+                continue
+            module_name_parts, module_paths = import_lookup_keys(imported_module)
+            for module_name_part in module_name_parts:
+                imported_files |= self.files_by_stem.get(module_name_part, set())
+            for module_path in module_paths:
+                imported_files |= self.files_by_module_path.get(module_path, set())
+        return sorted(imported_files)
+
+
+def parsed_file_is_imported(imported_modules, filename, importer=None):
+    filepath_stem = Path(filename).stem
+    module_paths = set(module_paths_from_filename(filename))
+    module_name = module_name_from_filename(filename)
     for imported_module in imported_modules:
-        imported_module_split = imported_module.module_base_name.split('.')
-        if filepath_stem == imported_module_split or filepath_stem in imported_module_split:
+        if imported_module.level:
+            if importer is not None and module_name in relative_module_paths(
+                imported_module, importer
+            ):
+                return True
+            continue
+        module_name_parts, import_module_paths = import_lookup_keys(imported_module)
+        if filepath_stem in module_name_parts or module_paths.intersection(
+            import_module_paths
+        ):
             return True
     return False
 
 
-def merge_graphs(graphs):
-    merged_graph = nx.DiGraph()
-    for graph in graphs:
-        merged_graph = nx.compose(merged_graph, graph)
-    return merged_graph
+def build_function_call_graph(parsed_files):
+    """Adds the nodes and edges of every file to one graph, in the order composing the local
+    call graphs of the files one by one would give, without copying the graph each time"""
+    function_call_graph = nx.DiGraph()
+    for parsed_file in parsed_files.values():
+        parsed_file.add_call_graph_to(function_call_graph)
+    return function_call_graph
 
 
 def build_file_level_graph(parsed_files):
@@ -75,17 +380,29 @@ def build_file_level_graph(parsed_files):
     for filename, parsed_file in parsed_files.items():
         file_level_graph.add_node(filename)
 
-    for filename, parsed_file in parsed_files.items():  # noqa
-        for filename_b, parsed_file_b in parsed_files.items():
-            if filename == filename_b:
-                continue
-            if parsed_file_is_imported(parsed_file.imported_modules, parsed_file_b):
-                file_level_graph.add_edge(filename, filename_b)
-    full_function_call_graph = merge_graphs(
-        [parsed_file.local_call_graph for parsed_file in parsed_files.values()]
-    )
-
-    return file_level_graph, full_function_call_graph
+    module_index = ModuleIndex(parsed_files)
+    for filename, parsed_file in parsed_files.items():
+        imported_filenames = module_index.resolve(parsed_file.imported_modules, filename)
+        for imported_filename in imported_filenames:
+            if imported_filename != filename:
+                file_level_graph.add_edge(filename, imported_filename)
+    return file_level_graph, build_function_call_graph(parsed_files)
+
+
+def nodes_with_content(graph, get_file_bytes):
+    """Puts the source text of every function back on its node as 'content', as parsing
+    used to, read from the span of the function in its file. get_file_bytes is called once
+    per file with the filepath stored on its nodes."""
+    file_bytes = {}
+    for _, attributes in graph.nodes(data=True):
+        if 'span' not in attributes:
+            continue
+        filepath = attributes['filepath']
+        if filepath not in file_bytes:
+            file_bytes[filepath] = get_file_bytes(filepath)
+        start_byte, end_byte = attributes['span']
+        attributes['content'] = file_bytes[filepath][start_byte:end_byte].decode('utf-8')
+    return graph
 
 
 def get_module_name_from_filepath(filepath, project_depth):
@@ -93,8 +410,20 @@ def get_module_name_from_filepath(filepath, project_depth):
     return module_name
 
 
-def build_graphs_for_project(local_project_dir=None, github_filelist=None, max_depth=3):
-    parsed_files = {}
+def build_graphs_for_project(
+    local_project_dir=None,
+    github_filelist=None,
+    max_depth=3,
+    parse_cache=None,
+    workers=1,
+    executor=None,
+):
+    """The file level graph and function call graph of a local directory or GitHub files
+
+    Files are parsed in workers processes when there is more than one, or in the given
+    process pool executor, which workers then only splits the files for.
+    """
+    source_files = []
     using_local = False
     assert (
         local_project_dir is not None or github_filelist is not None
@@ -124,33 +453,44 @@ def build_graphs_for_project(local_project_dir=None, github_filelist=None, max_d
         if current_depth > max_depth:
             continue
 
-        file_contents = None
-        if not using_local:
-            file_contents = filepath_pre.decoded_content
-
         module_name = get_module_name_from_filepath(filepath, project_depth)
-        parsed_file = parse_file(filepath, file_bytes=file_contents, module_name=module_name)
-        if parsed_file is None:
-            continue
-
-        parsed_files['/'.join(filepath.parts[project_depth:])] = parsed_file
+        if using_local:
+            get_file_bytes = partial(read_file_bytes, filepath)
+            file_sha = None
+        else:
+            # GitHub already knows the blob SHA, cached files are never downloaded
+            get_file_bytes = partial(getattr, filepath_pre, 'decoded_content')
+            file_sha = filepath_pre.sha
+        source_files.append(
+            (
+                '/'.join(filepath.parts[project_depth:]),
+                filepath,
+                module_name,
+                get_file_bytes,
+                file_sha,
+            )
+        )
+
+    if workers > 1 or executor is not None:
+        parsed_files = parse_files_in_parallel(source_files, parse_cache, workers, executor)
+    else:
+        parsed_files = {}
+        for filename, filepath, module_name, get_file_bytes, file_sha in source_files:
+            parsed_files[filename] = parse_file_with_cache(
+                parse_cache, filepath, get_file_bytes, module_name, file_sha
+            )
 
     file_level_graph, full_function_call_graph = build_file_level_graph(parsed_files)
 
     return file_level_graph, full_function_call_graph
 
 
-def get_network_from_gh_filelist(github_filelist):
+def get_network_from_gh_filelist(github_filelist, max_depth=3):
+    """vis.js nodes and edges of the function call graph and of the file level graph"""
     file_level_graph, full_function_call_graph = build_graphs_for_project(
-        github_filelist=github_filelist
+        github_filelist=github_filelist, max_depth=max_depth
     )
-    nt_files = Network(directed=True, bgcolor='#f2f3f4', height=1080, width=1080)
-    nt_files.from_nx(file_level_graph)
-
-    nt_all = Network(directed=True, bgcolor='#f2f3f4', height=1080, width=1080)
-    nt_all.from_nx(full_function_call_graph)
-
-    return nt_all, nt_files
+    return vis_data(full_function_call_graph), vis_data(file_level_graph)
 
 
 def get_filelist_from_gh_repo(repo, max_depth=4):
@@ -183,11 +523,19 @@ def github_python_test():
     repo = g.get_repo('Foxicution/repo-review')
     filelist = get_filelist_from_gh_repo(repo)
     logging.log(logging.DEBUG, f'Generating graph for {len(filelist)} files')
-    file_level_graph, full_function_call_graph = get_network_from_gh_filelist(filelist)
+    file_level_graph, full_function_call_graph = build_graphs_for_project(
+        github_filelist=filelist, max_depth=3
+    )
+
+    nt_files = Network(directed=True, bgcolor='#f2f3f4', height=1080, width=1080)
+    nt_files.from_nx(file_level_graph)
+
+    nt_all = Network(directed=True, bgcolor='#f2f3f4', height=1080, width=1080)
+    nt_all.from_nx(full_function_call_graph)
 
-    file_level_graph.show('python_files.html')
+    nt_files.show('python_files.html')
 
-    full_function_call_graph.show('python_all.html')
+    nt_all.show('python_all.html')
 
 
 def local_test():
@@ -0,0 +1,222 @@
+import json
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+import networkx as nx
+from git import Commit
+from git.repo import Repo
+
+from custom_language_parsers import LANGUAGES
+from graphing import (
+    ModuleIndex,
+    get_module_name_from_filepath,
+    parse_file_with_cache,
+    parsed_file_is_imported,
+)
+from parse_cache import ParseCache
+from repository_processing import get_repo
+
+
+@dataclass
+class GraphDelta:
+    """changes a single commit makes to the file level and function call graphs"""
+
+    commit: str
+    added_files: list[str] = field(default_factory=list)
+    removed_files: list[str] = field(default_factory=list)
+    added_file_edges: list[tuple[str, str]] = field(default_factory=list)
+    removed_file_edges: list[tuple[str, str]] = field(default_factory=list)
+    added_functions: list[str] = field(default_factory=list)
+    removed_functions: list[str] = field(default_factory=list)
+    added_calls: list[tuple[str, str]] = field(default_factory=list)
+    removed_calls: list[tuple[str, str]] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        """serializes the delta leaving out empty fields"""
+        return json.dumps(
+            {key: value for key, value in asdict(self).items() if value},
+            separators=(',', ':'),
+        )
+
+
+class IncrementalProjectGraphs:
+    """file level and function call graphs that are patched file by file"""
+
+    def __init__(self, parse_cache=None):
+        self.parse_cache = parse_cache
+        self.parsed_files = {}
+        self.module_index = ModuleIndex()
+        self.file_level_graph = nx.DiGraph()
+        self.full_function_call_graph = nx.DiGraph()
+        # Local call graphs overlap, so track how many files contribute each node and edge,
+        # and how many of them define the function rather than only call it
+        self.function_counts = Counter()
+        self.definition_counts = Counter()
+        self.call_counts = Counter()
+
+    def apply_commit(
+        self, commit: str, changed_files: dict, removed_files: list
+    ) -> GraphDelta:
+        """changed_files maps a path to a (blob sha, function returning blob bytes) pair"""
+        delta = GraphDelta(commit=commit)
+        previous_files = {}
+        for filename, (file_sha, get_file_bytes) in changed_files.items():
+            if filename in self.parsed_files:
+                previous_files[filename] = self.parsed_files[filename]
+            else:
+                delta.added_files.append(filename)
+                self.file_level_graph.add_node(filename)
+                self.module_index.add(filename)
+            filepath = Path(filename)
+            parsed_file = parse_file_with_cache(
+                self.parse_cache,
+                filepath,
+                get_file_bytes,
+                get_module_name_from_filepath(filepath, 0),
+                file_sha=file_sha,
+            )
+            self.parsed_files[filename] = parsed_file
+            # New contributions go in before old ones are dropped so unchanged calls stay put
+            self.add_call_graph(parsed_file.local_call_graph, delta)
+        for previous_file in previous_files.values():
+            self.remove_call_graph(previous_file.local_call_graph, delta)
+
+        for filename in removed_files:
+            if filename not in self.parsed_files:
+                continue
+            delta.removed_files.append(filename)
+            delta.removed_file_edges.extend(self.file_level_graph.in_edges(filename))
+            delta.removed_file_edges.extend(self.file_level_graph.out_edges(filename))
+            self.file_level_graph.remove_node(filename)
+            self.module_index.remove(filename)
+            self.remove_call_graph(self.parsed_files.pop(filename).local_call_graph, delta)
+
+        for filename in changed_files:
+            self.update_imports_of(filename, delta)
+        for filename in delta.added_files:
+            self.update_importers_of(filename, delta, skip=changed_files)
+        return delta
+
+    def update_imports_of(self, filename: str, delta: GraphDelta) -> None:
+        imported_modules = self.parsed_files[filename].imported_modules
+        previous_imports = set(self.file_level_graph.successors(filename))
+        imported_filenames = self.module_index.resolve(imported_modules, filename)
+        current_imports = set(imported_filenames) - {filename}
+        for imported_filename in current_imports - previous_imports:
+            self.file_level_graph.add_edge(filename, imported_filename)
+            delta.added_file_edges.append((filename, imported_filename))
+        for imported_filename in previous_imports - current_imports:
+            self.file_level_graph.remove_edge(filename, imported_filename)
+            delta.removed_file_edges.append((filename, imported_filename))
+
+    def update_importers_of(self, filename: str, delta: GraphDelta, skip: dict) -> None:
+        for filename_b, parsed_file_b in self.parsed_files.items():
+            if filename_b in skip:
+                continue
+            if parsed_file_is_imported(parsed_file_b.imported_modules, filename, filename_b):
+                self.file_level_graph.add_edge(filename_b, filename)
+                delta.added_file_edges.append((filename_b, filename))
+
+    def add_call_graph(self, local_call_graph: nx.DiGraph, delta: GraphDelta) -> None:
+        for function_name, attributes in local_call_graph.nodes(data=True):
+            self.function_counts[function_name] += 1
+            if self.function_counts[function_name] == 1:
+                delta.added_functions.append(function_name)
+            if 'filepath' in attributes:
+                self.definition_counts[function_name] += 1
+            self.full_function_call_graph.add_node(function_name, **attributes)
+        for call in local_call_graph.edges:
+            self.call_counts[call] += 1
+            if self.call_counts[call] == 1:
+                delta.added_calls.append(call)
+                self.full_function_call_graph.add_edge(*call)
+
+    def remove_call_graph(self, local_call_graph: nx.DiGraph, delta: GraphDelta) -> None:
+        for call in local_call_graph.edges:
+            self.call_counts[call] -= 1
+            if self.call_counts[call] == 0:
+                del self.call_counts[call]
+                delta.removed_calls.append(call)
+                self.full_function_call_graph.remove_edge(*call)
+        for function_name, attributes in local_call_graph.nodes(data=True):
+            if 'filepath' in attributes:
+                self.definition_counts[function_name] -= 1
+                if self.definition_counts[function_name] == 0:
+                    del self.definition_counts[function_name]
+                    # Still called elsewhere, the function is no longer defined anywhere
+                    self.full_function_call_graph.nodes[function_name].clear()
+            self.function_counts[function_name] -= 1
+            if self.function_counts[function_name] == 0:
+                del self.function_counts[function_name]
+                delta.removed_functions.append(function_name)
+                self.full_function_call_graph.remove_node(function_name)
+
+
+def is_supported(path: Optional[str], max_depth: Optional[int]) -> bool:
+    if path is None or Path(path).suffix[1:] not in LANGUAGES:
+        return False
+    return max_depth is None or len(Path(path).parts) <= max_depth
+
+
+def blob_reader(blob):
+    return lambda: blob.data_stream.read()
+
+
+def commit_changes(commit: Commit, max_depth: Optional[int] = None) -> tuple[dict, list]:
+    """files changed and removed by a commit, compared with its first parent"""
+    if not commit.parents:
+        changed_files = {
+            blob.path: (blob.hexsha, blob_reader(blob))
+            for blob in commit.tree.traverse()
+            if blob.type == 'blob' and is_supported(blob.path, max_depth)
+        }
+        return changed_files, []
+
+    changed_files = {}
+    removed_files = []
+    for diff in commit.parents[0].diff(commit):
+        if diff.deleted_file or diff.renamed_file:
+            if is_supported(diff.a_path, max_depth):
+                removed_files.append(diff.a_path)
+        if not diff.deleted_file and is_supported(diff.b_path, max_depth):
+            changed_files[diff.b_path] = (diff.b_blob.hexsha, blob_reader(diff.b_blob))
+    return changed_files, removed_files
+
+
+def graph_history(
+    repo: Repo,
+    rev: str = 'HEAD',
+    max_depth: Optional[int] = None,
+    project_graphs: Optional[IncrementalProjectGraphs] = None,
+) -> Iterator[GraphDelta]:
+    """walks the first parent history from the oldest commit, yielding a graph delta per commit"""
+    if project_graphs is None:
+        project_graphs = IncrementalProjectGraphs()
+    for commit in repo.iter_commits(rev, reverse=True, first_parent=True):
+        changed_files, removed_files = commit_changes(commit, max_depth)
+        yield project_graphs.apply_commit(commit.hexsha, changed_files, removed_files)
+
+
+def write_delta_stream(deltas: Iterator[GraphDelta], stream: TextIO) -> None:
+    for delta in deltas:
+        stream.write(delta.to_json() + '\n')
+
+
+def history_from_repository(repo_url: str, output_path: str) -> None:
+    """writes one json line of graph changes per commit of the repository"""
+    with open(output_path, 'w') as stream:
+        deltas = graph_history(
+            get_repo(repo_url, mode='history'),
+            project_graphs=IncrementalProjectGraphs(ParseCache()),
+        )
+        write_delta_stream(deltas, stream)
+
+
+def main():
+    history_from_repository('https://github.com/Foxicution/repo-review', 'history.jsonl')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import os
+import pickle
+from contextlib import suppress
+from hashlib import sha1, sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Optional
+
+# Bump whenever parse_file output changes so stale entries are never read
+PARSER_VERSION = 4
+# Directory the caches are kept in, the user cache directory when it is not set
+CACHE_DIRECTORY_VARIABLE = 'REPO_REVIEW_CACHE_DIR'
+
+
+def blob_sha(file_bytes: bytes) -> str:
+    """hashes file contents the same way git hashes a blob"""
+    return sha1(b'blob %d\0' % len(file_bytes) + file_bytes).hexdigest()
+
+
+def cache_directory() -> Path:
+    directory = os.environ.get(CACHE_DIRECTORY_VARIABLE)
+    if directory:
+        return Path(directory)
+    user_cache = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(user_cache) / 'repo-review'
+
+
+def stat_or_none(path: os.DirEntry | Path) -> Optional[os.stat_result]:
+    """the stat of a file, None once another thread or process has evicted it"""
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return None
+
+
+class ParseCache:
+    """on-disk cache of parsed files keyed by blob SHA, evicting least recently used entries"""
+
+    def __init__(
+        self, directory: Optional[str | Path] = None, max_bytes: int = 256 * 2**20
+    ):
+        self.directory = Path(directory or cache_directory() / 'parse_cache')
+        self.max_bytes = max_bytes
+        self._size = None
+
+    @staticmethod
+    def key(file_sha: str, extension: str, module_name: Optional[str]) -> str:
+        return sha256(
+            f'{PARSER_VERSION}:{extension}:{module_name}:{file_sha}'.encode()
+        ).hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        return self.directory / key[:2] / key[2:]
+
+    def entries(self) -> list[os.DirEntry]:
+        if not self.directory.exists():
+            return []
+        return [
+            entry
+            for bucket in os.scandir(self.directory)
+            if bucket.is_dir()
+            for entry in os.scandir(bucket.path)
+            if entry.is_file() and not entry.name.startswith('.')
+        ]
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(
+                stat.st_size for stat in map(stat_or_none, self.entries()) if stat is not None
+            )
+        return self._size
+
+    def get(self, key: str) -> Optional[object]:
+        entry_path = self.entry_path(key)
+        # Entries pickled from classes that have since changed or moved are misses too
+        try:
+            with open(entry_path, 'rb') as f:
+                parsed_file = pickle.load(f)
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            TypeError,
+            ImportError,
+        ):
+            return None
+        # Reading an entry makes it the most recently used one
+        with suppress(FileNotFoundError):
+            os.utime(entry_path)
+        return parsed_file
+
+    def put(self, key: str, parsed_file: object) -> None:
+        entry_path = self.entry_path(key)
+        previous = stat_or_none(entry_path)
+        size = self.size - (0 if previous is None else previous.st_size)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile('wb', dir=entry_path.parent, prefix='.', delete=False) as f:
+            pickle.dump(parsed_file, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, entry_path)
+        stat = stat_or_none(entry_path)
+        self._size = size + (0 if stat is None else stat.st_size)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """removes least recently used entries until the cache is back under 80% of its limit"""
+        entries = sorted(
+            (stat.st_mtime, stat.st_size, entry.path)
+            for entry in self.entries()
+            if (stat := stat_or_none(entry)) is not None
+        )
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry_path in entries:
+            if size <= self.max_bytes * 0.8:
+                break
+            size -= entry_size
+            with suppress(FileNotFoundError):
+                os.remove(entry_path)
+        self._size = size
@@ -1,10 +1,19 @@
 from dataclasses import dataclass
+from functools import partial
 from os.path import exists
+from pathlib import PurePosixPath
+from subprocess import PIPE
+from typing import IO, Iterable, Iterator, Optional
 from urllib.parse import quote, unquote
 
 from git import Tree
 from git.repo import Repo
 from toolz.functoolz import pipe
+from toolz.itertoolz import partition_all
+
+from custom_language_parsers import LANGUAGES
+
+SYMLINK_MODE = "120000"
 
 
 @dataclass
@@ -15,6 +24,16 @@ class File:
     content: str
 
 
+@dataclass
+class TreeEntry:
+    """represents a blob listed in a tree, its content is not read"""
+
+    path: str
+    sha: str
+    # Only read for the entries that are kept, see sized_entries
+    size: Optional[int] = None
+
+
 def random_string(string_length: int = 10) -> str:
     """generates a random string of fixed length"""
     from random import choice
@@ -39,36 +58,197 @@ def format_repo_url(repo_url: str) -> str:
     return repo_url.split("github.com/")[-1]
 
 
-def pull_repo(repo_path) -> Repo:
+@dataclass(frozen=True)
+class CloneOptions:
+    """how much of a repository is downloaded and checked out by get_repo"""
+
+    depth: Optional[int] = None
+    blob_filter: Optional[str] = None
+    sparse_extensions: tuple[str, ...] = ()
+    checkout: bool = True
+
+    def clone_arguments(self) -> dict:
+        # A sparse clone would check out the top level files, fetching their blobs, before
+        # the patterns are set, so the checkout is left to clone_repo
+        arguments = {
+            "no_checkout": not self.checkout or bool(self.sparse_extensions),
+            "sparse": bool(self.sparse_extensions),
+        }
+        if self.depth is not None:
+            arguments["depth"] = self.depth
+        if self.blob_filter is not None:
+            arguments["filter"] = self.blob_filter
+        return arguments
+
+    def fetch_arguments(self) -> dict:
+        return {} if self.depth is None else {"depth": self.depth}
+
+    def sparse_patterns(self) -> list[str]:
+        return [f"*.{extension}" for extension in self.sparse_extensions]
+
+
+CLONE_MODES = {
+    # One commit is analysed: no history, and only blobs of parsed languages are fetched,
+    # all at once while the sparse checkout is populated
+    "single": CloneOptions(
+        depth=1, blob_filter="blob:none", sparse_extensions=tuple(LANGUAGES)
+    ),
+    # Every commit is read from the object database, so blobs are fetched up front
+    # instead of one round trip at a time, but nothing is checked out
+    "history": CloneOptions(checkout=False),
+}
+
+
+def sparse_checkout(repo: Repo, options: CloneOptions) -> Repo:
+    """checks out only the files of the languages that are parsed"""
+    repo.git.sparse_checkout("set", "--no-cone", *options.sparse_patterns())
+    return repo
+
+
+def clone_repo(repo_url: str, repo_path: str, options: CloneOptions) -> Repo:
+    """clones a repository to a local directory"""
+    repo = Repo.clone_from(repo_url, repo_path, **options.clone_arguments())
+    if not options.sparse_extensions:
+        return repo
+    sparse_checkout(repo, options)
+    if options.checkout:
+        repo.git.checkout()
+    return repo
+
+
+def pull_repo(repo_path, options: CloneOptions = CloneOptions()) -> Repo:
     """pulls the latest changes from a repository in a local directory"""
     repo = Repo(repo_path)
-    repo.remote().pull()
+    repo.remote().fetch(**options.fetch_arguments())
+    # Shallow histories cannot always be merged, the local branch is moved to upstream instead
+    repo.git.reset("--hard" if options.checkout else "--soft", "@{upstream}")
     return repo
 
 
 # TODO: add Result monad to handle errors
-def get_repo(repo_url: str) -> Repo:
-    """clones a repository to a local directory"""
-    repo_path = f"repos/{pipe(repo_url, format_repo_url, to_url)}"
-    return pull_repo(repo_path) if exists(repo_path) else Repo.clone_from(repo_url, repo_path)
+def get_repo(repo_url: str, mode: str = "single") -> Repo:
+    """clones a repository to a local directory, or updates an existing clone"""
+    options = CLONE_MODES[mode]
+    repo_path = f"repos/{mode}/{pipe(repo_url, format_repo_url, to_url)}"
+    if exists(repo_path):
+        return pull_repo(repo_path, options)
+    return clone_repo(repo_url, repo_path, options)
+
+
+def split_stream(
+    stream: IO[bytes], separator: bytes = b"\0", chunk_size: int = 2**16
+) -> Iterator[bytes]:
+    """yields the separated records of a stream as they arrive"""
+    remainder = b""
+    for chunk in iter(partial(stream.read, chunk_size), b""):
+        *records, remainder = (remainder + chunk).split(separator)
+        yield from records
+    if remainder:
+        yield remainder
+
+
+def kill_process(process) -> None:
+    """stops a git process whose output is no longer read, it would block writing otherwise"""
+    process.proc.kill()
+    # Reads what is left in the pipes and closes them
+    process.proc.communicate()
+
+
+def traverse_tree(tree: Tree, path: str = "") -> Iterator[TreeEntry]:
+    """lazily lists every blob of a tree, without reading any content or size
+
+    Sizes are left out as git reads them from the blobs, which a partial clone would
+    fetch one at a time.
+    """
+    process = tree.repo.git.ls_tree("-r", "-z", tree.hexsha, as_process=True)
+    try:
+        for record in split_stream(process.stdout):
+            info, blob_path = record.decode().split("\t", 1)
+            mode, object_type, sha = info.split()
+            if object_type == "blob" and mode != SYMLINK_MODE:
+                yield TreeEntry(path=f"{path}/{blob_path}", sha=sha)
+    except BaseException:
+        # Including GeneratorExit, when the consumer stops before the end of the tree
+        kill_process(process)
+        raise
+    process.wait()
+
+
+def supported_entries(
+    entries: Iterable[TreeEntry], extensions: Iterable[str] = LANGUAGES
+) -> Iterator[TreeEntry]:
+    """filters out unsupported languages before anything is read"""
+    extensions = set(extensions)
+    for entry in entries:
+        if PurePosixPath(entry.path).suffix[1:] in extensions:
+            yield entry
+
+
+def sized_entries(
+    repo: Repo,
+    entries: Iterable[TreeEntry],
+    max_size: Optional[int] = 2**20,
+    batch_size: int = 256,
+) -> Iterator[TreeEntry]:
+    """reads sizes through a single git cat-file --batch-check process, dropping oversized
+    and missing blobs"""
+    process = repo.git.cat_file("--batch-check", as_process=True, istream=PIPE)
+    try:
+        for batch in partition_all(batch_size, entries):
+            process.stdin.write(b"".join(f"{entry.sha}\n".encode() for entry in batch))
+            process.stdin.flush()
+            for entry in batch:
+                header = process.stdout.readline().split()
+                if header[1] == b"missing":
+                    continue
+                size = int(header[2])
+                if max_size is None or size <= max_size:
+                    yield TreeEntry(path=entry.path, sha=entry.sha, size=size)
+    except BaseException:
+        kill_process(process)
+        raise
+    process.stdin.close()
+    process.wait()
 
 
-def traverse_tree(tree: Tree, path: str = "") -> list[File]:
-    """traverses a tree and returns the contents of each file"""
-    for blob in tree.blobs:
-        yield File(path=f"{path}/{blob.name}", content=blob.data_stream.read())
-    for sub_tree in tree.trees:
-        yield from traverse_tree(sub_tree, f"{path}/{sub_tree.name}")
+def read_blobs(
+    repo: Repo, entries: Iterable[TreeEntry], batch_size: int = 256
+) -> Iterator[File]:
+    """reads blobs in batches through a single git cat-file --batch process"""
+    process = repo.git.cat_file("--batch", as_process=True, istream=PIPE)
+    try:
+        for batch in partition_all(batch_size, entries):
+            # A batch of object names is small enough to never fill the pipe while git answers
+            process.stdin.write(b"".join(f"{entry.sha}\n".encode() for entry in batch))
+            process.stdin.flush()
+            for entry in batch:
+                header = process.stdout.readline().split()
+                if header[1] == b"missing":
+                    continue
+                content = process.stdout.read(int(header[2]))
+                process.stdout.read(1)
+                yield File(path=entry.path, content=content)
+    except BaseException:
+        # Including GeneratorExit, when the consumer stops while git still has output
+        kill_process(process)
+        raise
+    process.stdin.close()
+    process.wait()
 
 
-def repo_file_list(repo: Repo) -> list[File]:
-    """returns the contents of all files in a repository"""
-    tree = repo.head.commit.tree
-    return list(traverse_tree(tree))
+def repo_file_list(repo: Repo) -> Iterator[File]:
+    """lazily returns the contents of the supported files in a repository"""
+    return pipe(
+        repo.head.commit.tree,
+        traverse_tree,
+        supported_entries,
+        partial(sized_entries, repo),
+        partial(read_blobs, repo),
+    )
 
 
-def files_from_repository(repo_url: str) -> list[File]:
-    """returns the contents of all files in a repository"""
+def files_from_repository(repo_url: str) -> Iterator[File]:
+    """lazily returns the contents of the supported files in a repository"""
     return pipe(repo_url, get_repo, repo_file_list)
 
 
@@ -1,13 +1,13 @@
 from toolz.functoolz import pipe
 
-from files_from_github import file_list
+from files_from_github import tree_file_list
 from graphing import get_network_from_gh_filelist
 
 
 def main():
     pipe(
         "https://github.com/python/mypy",
-        file_list,
+        tree_file_list,
         get_network_from_gh_filelist,
         print,
     )
@@ -0,0 +1,78 @@
+import json
+
+import networkx as nx
+
+try:
+    import orjson
+except ImportError:  # orjson comes with fastapi[all], the json module gives the same output
+    orjson = None
+
+# Node attributes the browser draws with, everything else stays on the server
+NODE_FIELDS = ('label', 'title', 'color', 'size', 'shape')
+
+# What pyvis sent with every node and edge is set once here instead
+VIS_OPTIONS = {
+    'configure': {'enabled': False},
+    'nodes': {'shape': 'dot', 'size': 10},
+    'edges': {
+        'arrows': 'to',
+        'color': {'inherit': True},
+        'smooth': {'enabled': True, 'type': 'dynamic'},
+    },
+    'interaction': {'dragNodes': True, 'hideEdgesOnDrag': False, 'hideNodesOnDrag': False},
+    'physics': {
+        'enabled': True,
+        'stabilization': {
+            'enabled': True,
+            'fit': True,
+            'iterations': 1000,
+            'onlyDynamicEdges': False,
+            'updateInterval': 50,
+        },
+    },
+}
+
+
+def vis_node(node, attributes: dict, fields: tuple[str, ...] = NODE_FIELDS) -> dict:
+    """a vis.js node with only the given fields, labelled with its id unless it has a label"""
+    node_data = {'id': node, 'label': node}
+    node_data.update((field, attributes[field]) for field in fields if field in attributes)
+    return node_data
+
+
+def vis_nodes(graph: nx.Graph, fields: tuple[str, ...] = NODE_FIELDS) -> list[dict]:
+    return [vis_node(node, attributes, fields) for node, attributes in graph.nodes(data=True)]
+
+
+def vis_edges(graph: nx.Graph) -> list[dict]:
+    """vis.js edges, an edge weight becomes its width"""
+    edges = []
+    for source, target, weight in graph.edges(data='weight'):
+        edge = {'from': source, 'to': target}
+        if weight is not None:
+            edge['width'] = weight
+        edges.append(edge)
+    return edges
+
+
+def vis_data(graph: nx.Graph) -> dict:
+    return {'nodes': vis_nodes(graph), 'edges': vis_edges(graph)}
+
+
+def node_details(graph: nx.Graph, fields: tuple[str, ...] = NODE_FIELDS) -> dict:
+    """the attributes of every node that vis_nodes leaves out, to be fetched on a click"""
+    return {
+        node: {key: value for key, value in attributes.items() if key not in fields}
+        for node, attributes in graph.nodes(data=True)
+    }
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def vis_parameters(graph: nx.Graph) -> tuple[str, str]:
+    """the vis.js data and options of a graph as json strings"""
+    return dumps(vis_data(graph)).decode(), dumps(VIS_OPTIONS).decode()
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+
+# The app imports modules as python_components.x and src.x, while the modules in src import
+# each other by their bare names
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from frontend.app import graph_cache as graph_cache_module
+from frontend.app.graph_cache import GraphCache, GraphOptions, graph_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(graph_cache_module, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_graph_keys_pin_the_repository_commit_and_options():
+    key = graph_key('owner/repository', 'abc123', GraphOptions())
+    assert key == graph_key('owner/repository', 'abc123', GraphOptions())
+    assert key != graph_key('owner/repository', 'def456', GraphOptions())
+    assert key != graph_key('owner/repository', 'abc123', GraphOptions(node_budget=100))
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = GraphCache(ttl=60)
+    cached_graph = cache.put('a', {'nodes': []})
+    clock.now += 60
+    assert cache.get('a') is cached_graph
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.entries == {} and cache.size == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = GraphCache(max_entries=2)
+    cache.put('a', {'nodes': []})
+    cache.put('b', {'nodes': []})
+    cache.get('a')
+    cache.put('c', {'nodes': []})
+    assert list(cache.entries) == ['a', 'c']
+
+
+def test_entries_are_evicted_by_size_but_the_newest_is_kept(clock):
+    cache = GraphCache(max_bytes=250)
+    cache.put('a', {'nodes': ['x' * 100]})
+    cache.put('b', {'nodes': ['x' * 100]})
+    assert list(cache.entries) == ['a', 'b']
+    cache.put('c', {'nodes': ['x' * 100]}, nodes={'x': {'content': 'y' * 100}})
+    assert list(cache.entries) == ['c']
+    cache.put('c', {'nodes': ['x' * 1000]})
+    assert list(cache.entries) == ['c']
+    assert cache.size == cache.entries['c'].size
+
+
+def test_etags_follow_the_body(clock):
+    cache = GraphCache()
+    first = cache.put('a', {'nodes': [1]})
+    assert cache.put('b', {'nodes': [1]}).etag == first.etag
+    assert cache.put('c', {'nodes': [2]}).etag != first.etag
+    assert cache.get('a').nodes == {}
+    assert cache.put('d', {}, nodes={'n': {'code': 'x'}}).nodes == {'n': b'{"code":"x"}'}
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+# The jobs module fetches repositories through src.files_from_github, which reads the
+# github token from the streamlit secrets
+pytest.importorskip('streamlit')
+
+from frontend.app.jobs import DONE, FAILED, RUNNING, JobQueue  # noqa: E402
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+class FakeAnalysis:
+    """an analysis that reports a stage and then waits until it is released"""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.repositories = []
+
+    def __call__(self, repository_link, report):
+        self.repositories.append(repository_link)
+        report('fetching files')
+        assert self.released.wait(5)
+        if 'broken' in repository_link:
+            raise ValueError('no such repository')
+        return {'graph': f'/graphs/{repository_link}'}
+
+
+@pytest.fixture
+def analysis():
+    analysis = FakeAnalysis()
+    yield analysis
+    analysis.released.set()
+
+
+def test_requests_for_one_repository_share_a_job(analysis):
+    jobs = JobQueue(analysis)
+    job = jobs.submit('https://github.com/Owner/Repository')
+    assert jobs.submit('owner/repository.git') is job
+    wait_for(lambda: job.stage == 'fetching files')
+    assert job.status == RUNNING
+    analysis.released.set()
+    wait_for(lambda: job.status == DONE)
+    assert job.to_dict()['result'] == {'graph': '/graphs/https://github.com/Owner/Repository'}
+    assert analysis.repositories == ['https://github.com/Owner/Repository']
+    # Once the job is finished the next request analyses the repository again
+    assert jobs.submit('owner/repository') is not job
+    jobs.shutdown()
+
+
+def test_failures_are_reported_on_the_job(analysis):
+    jobs = JobQueue(analysis)
+    job = jobs.submit('owner/broken')
+    analysis.released.set()
+    wait_for(lambda: not job.in_flight)
+    assert job.status == FAILED and job.stage == 'failed'
+    assert job.to_dict()['error'] == 'ValueError: no such repository'
+    assert 'result' not in job.to_dict()
+    assert job.finished is not None
+    jobs.shutdown()
+
+
+def test_only_the_latest_finished_jobs_are_kept(analysis):
+    jobs = JobQueue(analysis, workers=1, max_finished_jobs=2)
+    analysis.released.set()
+    finished = []
+    for number in range(4):
+        job = jobs.submit(f'owner/repository-{number}')
+        wait_for(lambda: not job.in_flight)
+        finished.append(job.id)
+    analysis.released.clear()
+    running = jobs.submit('owner/running')
+    wait_for(lambda: running.status == RUNNING)
+    assert [jobs.get(job_id) is not None for job_id in finished] == [False, False, True, True]
+    assert jobs.get(running.id) is running
+    analysis.released.set()
+    jobs.shutdown()
@@ -0,0 +1,65 @@
+import asyncio
+import json
+from pathlib import Path
+
+import networkx as nx
+import pytest
+from fastapi import HTTPException
+
+# The app queues analyses whose module reads the github token from the streamlit secrets
+pytest.importorskip('streamlit')
+
+from frontend.app.graph_cache import GraphOptions  # noqa: E402
+from src.graph_clustering import ClusterTree  # noqa: E402
+
+ROOT = Path(__file__).parents[3]
+
+
+@pytest.fixture
+def main(monkeypatch):
+    # Templates and static files are found relative to the repository root
+    monkeypatch.chdir(ROOT)
+    from frontend.app import main
+
+    yield main
+    main.graph_cache.entries.clear()
+    main.graph_cache.size = 0
+
+
+def test_graphs_are_sent_with_an_etag(main):
+    cached_graph = main.graph_cache.put('a', {'files': {'nodes': [], 'edges': []}})
+    response = asyncio.run(main.graphs('a', if_none_match=None))
+    assert response.status_code == 200
+    assert response.body == cached_graph.body
+    assert response.headers['etag'] == cached_graph.etag
+    assert 'max-age' in response.headers['cache-control']
+
+
+def test_unchanged_graphs_are_not_sent_again(main):
+    cached_graph = main.graph_cache.put('a', {'files': {'nodes': [], 'edges': []}})
+    response = asyncio.run(main.graphs('a', if_none_match=cached_graph.etag))
+    assert response.status_code == 304
+    assert response.body == b''
+    assert response.headers['etag'] == cached_graph.etag
+    response = asyncio.run(main.graphs('a', if_none_match='"stale"'))
+    assert response.status_code == 200
+
+
+def test_unknown_graphs_are_not_found(main):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.graphs('missing', if_none_match=None))
+    assert error.value.status_code == 404
+
+
+def test_clusters_expand_with_the_budget_the_graph_was_built_with(main):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(
+        (f'pkg.module.f_{number}', {'filepath': 'pkg/module.py'}) for number in range(3)
+    )
+    main.graph_cache.put(
+        'a', {}, clusters=ClusterTree(graph), options=GraphOptions(node_budget=2)
+    )
+    response = asyncio.run(main.graph_cluster('a', 'cluster:pkg.module', offset=0))
+    children = json.loads(response.body)
+    assert [node['id'] for node in children['nodes']] == ['pkg.module.f_0', 'pkg.module.f_1']
+    assert children['more'] == 1
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from python_components import firestore_writer
+from python_components.firestore_writer import BufferedWriter
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, reference, document: dict) -> None:
+        self.writes.append((reference, document))
+
+    def commit(self) -> None:
+        with self.client.lock:
+            self.client.attempts += 1
+            if self.client.failures:
+                self.client.failures -= 1
+                raise RuntimeError('unavailable')
+            for (collection, document_id), document in self.writes:
+                self.client.collections.setdefault(collection, {})[document_id] = document
+            self.client.commits.append([document for _, document in self.writes])
+            self.client.committed.set()
+
+
+class FakeCollection:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+
+    def document(self) -> tuple[str, int]:
+        with self.client.lock:
+            self.client.document_ids += 1
+            return self.name, self.client.document_ids
+
+
+class FakeClient:
+    """keeps documents in memory, with the batch() and collection() of firestore.Client
+
+    The next failures commits raise, like an unavailable service would.
+    """
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = 0
+        self.document_ids = 0
+        self.collections = {}
+        self.commits = []
+        self.committed = threading.Event()
+        self.lock = threading.Lock()
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+
+def documents(count: int) -> list[dict]:
+    return [{'response': f'review {number}'} for number in range(count)]
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+def test_full_batches_are_committed_right_away(client):
+    writer = BufferedWriter(client, max_batch_size=3, flush_interval=60)
+    for document in documents(4):
+        writer.add(document)
+    assert client.committed.wait(5)
+    assert client.commits == [documents(3)]
+    writer.close()
+    assert client.commits == [documents(3), documents(4)[3:]]
+
+
+def test_batches_are_committed_after_the_flush_interval(client):
+    writer = BufferedWriter(client, flush_interval=0.05)
+    writer.add(documents(1)[0])
+    assert client.committed.wait(5)
+    assert client.commits == [documents(1)]
+    assert writer.committed == 1
+    writer.close()
+
+
+def test_close_commits_every_waiting_document(client):
+    writer = BufferedWriter(client, flush_interval=60)
+    for document in documents(5):
+        writer.add(document)
+    writer.close()
+    assert not writer.thread.is_alive()
+    assert client.commits == [documents(5)]
+    assert sorted(client.collections['ai_responses'].values(), key=str) == documents(5)
+    assert writer.committed == 5 and writer.failed == 0
+
+
+def test_failed_commits_are_retried_and_then_counted(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(firestore_writer.time, 'sleep', sleeps.append)
+    client = FakeClient(failures=3)
+    writer = BufferedWriter(client, flush_interval=60, max_attempts=2, backoff=0.5)
+    for document in documents(2):
+        writer.add(document)
+    writer.close()
+    # There is no wait after the last attempt
+    assert client.attempts == 2 and sleeps == [0.5]
+    assert writer.failed == 2 and writer.committed == 0
+    writer = BufferedWriter(client, flush_interval=60, max_attempts=2, backoff=0.5)
+    writer.add(documents(1)[0])
+    writer.close()
+    assert client.attempts == 4 and client.commits == [documents(1)]
+    assert writer.committed == 1 and writer.failed == 0
@@ -0,0 +1,33 @@
+from python_components.import_scanner import file_imports
+
+
+def test_backslash_continued_names():
+    assert file_imports('from a import b, \\\n    c\n', 'p/q') == ['a/b', 'a/c']
+    assert file_imports('import os, \\\n    sys\n', 'p/q') == ['os', 'sys']
+
+
+def test_backslash_continued_statement():
+    assert file_imports('from a \\\n    import b\n', 'p/q') == ['a/b']
+
+
+def test_comment_ending_in_backslash_does_not_continue():
+    assert file_imports('# C:\\\nimport os\n', 'p/q') == ['os']
+
+
+def test_strings_and_comments_are_skipped():
+    code = (
+        'text = "# not a comment \' import fake"\n'
+        "doc = '''\nimport inside_docstring\n'''\n"
+        'import real  # import commented\n'
+    )
+    assert file_imports(code, 'p/q') == ['real']
+
+
+def test_parenthesized_aliased_and_relative_imports():
+    code = 'from ..pkg import (\n    a as b,\n    c,\n)\nfrom . import d\n'
+    assert file_imports(code, 'root/sub/module') == ['root/pkg/a', 'root/pkg/c', 'root/sub/d']
+
+
+def test_raise_from_and_yield_from_are_not_imports():
+    code = 'def f():\n    yield from g()\n    raise E from e\nif x: import y\n'
+    assert file_imports(code, 'p/q') == ['y']
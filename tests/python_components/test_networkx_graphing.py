@@ -0,0 +1,58 @@
+from python_components.networkx_graphing import (
+    EXTERNAL_EDGE_WEIGHT,
+    INTERNAL_EDGE_WEIGHT,
+    FileIndex,
+    fix_edges,
+)
+
+FILES = ['pkg/__init__', 'pkg/file_3', 'pkg/file_30', 'pkg/sub/file_4', 'main']
+
+
+def test_files_resolve_to_themselves():
+    assert FileIndex(FILES).resolve('pkg/file_3') == [('pkg/file_3', INTERNAL_EDGE_WEIGHT)]
+
+
+def test_names_resolve_to_the_file_defining_them():
+    index = FileIndex(FILES)
+    assert index.resolve('pkg/file_3/function') == [('pkg/file_3', INTERNAL_EDGE_WEIGHT)]
+    assert index.resolve('main/function') == [('main', INTERNAL_EDGE_WEIGHT)]
+
+
+def test_wildcards_resolve_to_every_file_below_the_package():
+    index = FileIndex(FILES)
+    assert sorted(index.resolve('pkg/sub/*')) == [('pkg/sub/file_4', INTERNAL_EDGE_WEIGHT)]
+    assert sorted(index.resolve('pkg/*')) == [
+        (file_name, INTERNAL_EDGE_WEIGHT) for file_name in sorted(FILES[:4])
+    ]
+
+
+def test_wildcards_match_whole_path_components():
+    index = FileIndex(FILES)
+    assert index.resolve('pkg/file_3/*') == [('pkg/file_3', INTERNAL_EDGE_WEIGHT)]
+    assert index.resolve('pkg/file_/*') == []
+
+
+def test_other_imports_resolve_to_their_top_level_package():
+    index = FileIndex(FILES)
+    assert index.resolve('os') == [('os', EXTERNAL_EDGE_WEIGHT)]
+    assert index.resolve('numpy/linalg/norm') == [('numpy', EXTERNAL_EDGE_WEIGHT)]
+    # A module of the repository package that is not one of its files
+    assert index.resolve('pkg/missing/function') == [('pkg', EXTERNAL_EDGE_WEIGHT)]
+
+
+def test_every_import_becomes_an_edge_to_the_importer():
+    graph_nodes = [
+        {'id': 'main', 'imports': ['pkg/file_3/function', 'os', 'pkg/sub/*']},
+        {'id': 'pkg/file_3', 'imports': []},
+        {'id': 'pkg/sub/file_4', 'imports': ['pkg/file_3']},
+    ]
+    nodes, edges, file_names = fix_edges(graph_nodes)
+    assert nodes[0]['imports'] == ['pkg/file_3', 'os', 'pkg/sub/file_4']
+    assert graph_nodes[0]['imports'] == ['pkg/file_3/function', 'os', 'pkg/sub/*']
+    assert edges == [
+        ('pkg/file_3', 'main', INTERNAL_EDGE_WEIGHT),
+        ('os', 'main', EXTERNAL_EDGE_WEIGHT),
+        ('pkg/sub/file_4', 'main', INTERNAL_EDGE_WEIGHT),
+        ('pkg/file_3', 'pkg/sub/file_4', INTERNAL_EDGE_WEIGHT),
+    ]
+    assert file_names == ['main', 'pkg/file_3', 'pkg/sub/file_4']
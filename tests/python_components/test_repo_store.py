@@ -0,0 +1,69 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from python_components.repo_store import FILE_MODE, RepoStore
+
+
+def nodes(name: str) -> list[dict]:
+    return [
+        {
+            'id': f'{name}/module',
+            'code': f'print("{name}")\n',
+            'Readability': {'response': 'Fine.', 'score': 7},
+        }
+    ]
+
+
+def test_concurrent_saves_keep_every_repository(tmp_path):
+    repositories = [f'owner/repository_{i}' for i in range(16)]
+    start = threading.Barrier(len(repositories))
+
+    def save(repository):
+        start.wait()
+        RepoStore(tmp_path).save(repository, nodes(repository))
+
+    threads = [threading.Thread(target=save, args=(name,)) for name in repositories]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert RepoStore(tmp_path).repositories() == sorted(repositories)
+
+
+def test_saved_files_get_the_default_file_mode(tmp_path):
+    store = RepoStore(tmp_path)
+    store.save('owner/repository', nodes('owner/repository'))
+    paths = [tmp_path / 'manifest.json'] + [
+        store.path('owner/repository', suffix)
+        for suffix in ('nodes.json', 'fields.json', 'blobs')
+    ]
+    assert [stat.S_IMODE(os.stat(path).st_mode) for path in paths] == [FILE_MODE] * 4
+
+
+def test_closing_the_store_closes_its_memory_maps(tmp_path):
+    with RepoStore(tmp_path) as store:
+        store.save('owner/repository', nodes('owner/repository'))
+        assert store.code('owner/repository', 'owner/repository/module') == (
+            'print("owner/repository")\n'
+        )
+        assert store.response(
+            'owner/repository', 'owner/repository/module', 'Readability'
+        ) == ('Fine.')
+        [blobs] = store._blobs.values()
+    assert blobs.closed and not store._blobs
+
+
+def test_saving_again_closes_the_memory_map_of_the_replaced_generation(tmp_path):
+    store = RepoStore(tmp_path)
+    store.save('owner/repository', nodes('owner/repository'))
+    store.code('owner/repository', 'owner/repository/module')
+    [previous] = store._blobs.values()
+    store.save('owner/repository', nodes('owner/other'))
+    assert previous.closed and not store._blobs
+    assert store.code('owner/repository', 'owner/other/module') == 'print("owner/other")\n'
+    with pytest.raises(KeyError):
+        store.code('owner/repository', 'owner/repository/module')
+    store.close()
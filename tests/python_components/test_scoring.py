@@ -0,0 +1,146 @@
+import asyncio
+import json
+import re
+from functools import partial
+
+import httpx
+
+from python_components import scoring
+from python_components.scoring import CompletionClient, ScoringSettings, combined_review_files
+from src.completion_cache import CompletionCache
+
+PROMPTS = {
+    'Readability': 'Review the readability of this code:\n{Code}',
+    'Testability': 'Review the testability of this code:\n{Code}',
+}
+
+
+def combined_answer(prompt: str) -> str:
+    numbers = re.findall(r'^File (\d+):$', prompt, re.MULTILINE)
+    return json.dumps(
+        {
+            number: {criterion: {'review': 'Fine.', 'score': 7} for criterion in PROMPTS}
+            for number in numbers
+        }
+    )
+
+
+def completion_server(request: httpx.Request) -> httpx.Response:
+    """answers combined prompts, and without any choices for code that asks to be broken"""
+    prompt = json.loads(request.content)['prompt']
+    if 'broken' in prompt:
+        return httpx.Response(200, json={})
+    return httpx.Response(200, json={'choices': [{'text': combined_answer(prompt)}]})
+
+
+def combined_reviews(files: list[tuple[str, str]], **settings) -> dict:
+    async def review():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(completion_server), base_url='http://test/v1'
+        ) as client:
+            completion_client = CompletionClient(
+                ScoringSettings(mode='combined', **settings), client
+            )
+            return await combined_review_files(completion_client, files, PROMPTS)
+
+    return asyncio.run(review())
+
+
+def test_failed_batch_only_fails_its_files():
+    files = [('a.py', 'x = 1\n'), ('b.py', 'broken = 2\n'), ('c.py', 'y = 3\n')]
+    reviews = combined_reviews(files, batch_size=3)
+    assert set(reviews) == {
+        (file_id, criterion) for file_id, _ in files for criterion in PROMPTS
+    }
+    for criterion in PROMPTS:
+        assert isinstance(reviews['b.py', criterion], ValueError)
+        assert reviews['a.py', criterion].score == 7
+        assert reviews['c.py', criterion].score == 7
+
+
+def test_reviews_keep_only_their_own_file():
+    files = [('a.py', 'first = 1\n'), ('b.py', 'second = 2\n')]
+    reviews = combined_reviews(files, batch_size=2)
+    first, second = reviews['a.py', 'Readability'], reviews['b.py', 'Testability']
+    assert 'first = 1' in first.fin and 'second = 2' not in first.fin
+    assert 'second = 2' in second.fin and 'first = 1' not in second.fin
+    assert 'Testability' not in first.fin
+
+
+class SlowCompletionServer:
+    """answers after a short wait, counting the requests it is answering at the same time"""
+
+    def __init__(self):
+        self.active = 0
+        self.most_active = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        prompt = json.loads(request.content)['prompt']
+        if 'broken' in prompt:
+            return httpx.Response(400, json={'error': 'bad request'})
+        text = '7' if prompt.endswith('1 to 10:') else 'Fine.'
+        return httpx.Response(200, json={'choices': [{'text': text}]})
+
+
+def test_separate_reviews_are_limited_and_isolated(monkeypatch):
+    server = SlowCompletionServer()
+    monkeypatch.setattr(
+        scoring.httpx,
+        'AsyncClient',
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(server)),
+    )
+    files = [(f'{i}.py', f'x = {i}\n') for i in range(5)] + [('broken.py', 'broken = 1\n')]
+    reviews = scoring.score_files(files, PROMPTS, ScoringSettings(concurrency=3))
+    assert server.most_active == 3
+    for file_id, _ in files:
+        for criterion in PROMPTS:
+            review = reviews[file_id, criterion]
+            if file_id == 'broken.py':
+                assert isinstance(review, httpx.HTTPStatusError)
+            else:
+                assert review.score == 7
+
+
+def test_single_chunk_files_are_sent_compacted(monkeypatch):
+    prompts = []
+
+    def server(request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)['prompt']
+        prompts.append(prompt)
+        text = '7' if prompt.endswith('1 to 10:') else 'Fine.'
+        return httpx.Response(200, json={'choices': [{'text': text}]})
+
+    monkeypatch.setattr(
+        scoring.httpx,
+        'AsyncClient',
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(server)),
+    )
+    code = '# A long licence header\n' * 1000 + 'def f():\n    return 1\n'
+    reviews = scoring.score_files([('a.py', code)], PROMPTS, ScoringSettings())
+    assert reviews['a.py', 'Readability'].score == 7
+    for prompt in prompts:
+        # The instructions are kept and the header is left out
+        assert prompt.startswith('Review the')
+        assert 'licence' not in prompt and 'def f():\n    return 1' in prompt
+
+
+def test_cached_completions_are_not_requested_again(tmp_path, monkeypatch, caplog):
+    server = SlowCompletionServer()
+    monkeypatch.setattr(
+        scoring.httpx,
+        'AsyncClient',
+        partial(httpx.AsyncClient, transport=httpx.MockTransport(server)),
+    )
+    cache = CompletionCache(tmp_path / 'completions.sqlite3')
+    files = [('a.py', 'x = 1\n'), ('b.py', 'y = 2\n')]
+    scoring.score_files(files, PROMPTS, ScoringSettings(), cache)
+    with caplog.at_level('INFO', logger=scoring.__name__):
+        reviews = scoring.score_files(files, PROMPTS, ScoringSettings(), cache)
+    assert reviews['b.py', 'Testability'].score == 7
+    # Two completions, a review and a score, for every file and prompt
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 8
+    assert 'Completion cache: 8 hits, 8 misses' in caplog.text
@@ -0,0 +1,51 @@
+from itertools import count
+from types import SimpleNamespace
+
+import completion_cache as completion_cache_module
+from completion_cache import CompletionCache
+from parse_cache import CACHE_DIRECTORY_VARIABLE
+
+
+def test_cache_is_kept_in_the_cache_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(CACHE_DIRECTORY_VARIABLE, str(tmp_path / 'caches'))
+    cache = CompletionCache()
+    assert cache.path == tmp_path / 'caches' / 'completions.sqlite3'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['caches']
+
+
+def test_keys_depend_on_the_model_template_and_code():
+    keys = [
+        CompletionCache.key('model', 'Review {Code}', 'x = 1'),
+        CompletionCache.key('other model', 'Review {Code}', 'x = 1'),
+        CompletionCache.key('model', 'Score {Code}', 'x = 1'),
+        CompletionCache.key('model', 'Review {Code}', 'x = 2'),
+    ]
+    assert keys[0] == CompletionCache.key('model', 'Review {Code}', 'x = 1')
+    assert len(set(keys)) == len(keys)
+
+
+def test_completions_outlive_the_cache_and_are_counted(tmp_path):
+    cache = CompletionCache(tmp_path / 'completions.sqlite3')
+    key = CompletionCache.key('model', 'Review {Code}', 'x = 1')
+    assert cache.get(key) is None
+    cache.put(key, 'Fine.', 'model', 'Review {Code}')
+    assert cache.get(key) == 'Fine.'
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 1}
+    assert CompletionCache(tmp_path / 'completions.sqlite3').get(key) == 'Fine.'
+
+
+def test_least_recently_used_completions_are_evicted(tmp_path, monkeypatch):
+    clock = count()
+    monkeypatch.setattr(
+        completion_cache_module, 'time', SimpleNamespace(time=lambda: next(clock))
+    )
+    cache = CompletionCache(tmp_path / 'completions.sqlite3', max_entries=5)
+    for number in range(5):
+        cache.put(str(number), f'completion {number}')
+    assert cache.get('0') == 'completion 0'
+    cache.put('5', 'completion 5')
+    # Back to 80% of the limit, the first entry was used after the others were added
+    kept = [key for key in map(str, range(6)) if cache.get(key) is not None]
+    assert kept == ['0', '3', '4', '5']
+    assert cache.stats()['entries'] == 4
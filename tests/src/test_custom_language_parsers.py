@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from graphing import parse_file
+
+
+def calls(extension: str, code: str) -> list[str]:
+    return parse_file(Path(f'module.{extension}'), code.encode(), 'module').function_calls
+
+
+def test_rust_callees():
+    code = 'fn f() { foo::bar(); x.m(); g(); a::b::<T>(1); self.c.d(); }'
+    assert calls('rs', code) == ['foo.bar', 'x.m', 'g', 'a.b', 'self.c.d']
+
+
+def test_csharp_callees():
+    code = 'class A { void F() { Foo.Bar(); G(); x.y.Z(); H<int>(); this.K(); } }'
+    assert calls('cs', code) == ['Foo.Bar', 'G', 'x.y.Z', 'H', 'this.K']
+
+
+def test_java_callees():
+    code = 'class A { void f() { foo.bar(); g(); a.b().c(); this.k(); } }'
+    assert calls('java', code) == ['foo.bar', 'g', 'a.b().c', 'a.b', 'this.k']
+
+
+def test_calls_to_functions_of_the_same_file_are_qualified():
+    code = 'fn f() { g(); }\nfn g() {}'
+    graph = parse_file(Path('module.rs'), code.encode(), 'module').local_call_graph
+    assert list(graph.edges) == [('module.f', 'module.g')]
@@ -0,0 +1,92 @@
+import io
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from files_from_archive import ChunkReader, archive_file_list, archive_files
+from parse_cache import blob_sha
+
+FILES = {
+    'a.py': b'import os\n',
+    'pkg/b.py': b'def b():\n    pass\n',
+    'pkg/sub/c.rs': b'fn c() {}\n' * 100,
+    'README.md': b'# Read me',
+}
+
+
+def tarball(files: dict) -> bytes:
+    """a gzipped tarball laid out like the ones GitHub serves"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        directory = tarfile.TarInfo('owner-repository-abc123')
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for path, content in files.items():
+            member = tarfile.TarInfo(f'owner-repository-abc123/{path}')
+            member.size = len(content)
+            archive.addfile(member, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    """redirects the tarball endpoint to the archive, as the api does to codeload"""
+
+    def do_GET(self):
+        if self.path == '/repos/owner/repository/tarball/abc123':
+            self.send_response(302)
+            self.send_header('Location', '/codeload/owner/repository/abc123')
+            self.end_headers()
+            return
+        if self.path != '/codeload/owner/repository/abc123':
+            return self.send_error(404)
+        data = tarball(FILES)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_supported_files_are_read_from_a_tarball():
+    data = tarball(FILES)
+    # Small chunks, each read of the tarfile spans several of them
+    chunks = (data[start : start + 7] for start in range(0, len(data), 7))
+    files = archive_files(ChunkReader(chunks))
+    contents = {file.path: (file.sha, file.size, file.decoded_content) for file in files}
+    assert contents == {
+        path: (blob_sha(content), len(content), content)
+        for path, content in FILES.items()
+        if path != 'README.md'
+    }
+
+
+def test_large_files_are_skipped():
+    files = archive_files(io.BytesIO(tarball(FILES)), max_size=100)
+    assert sorted(file.path for file in files) == ['a.py', 'pkg/b.py']
+
+
+def test_tarball_is_streamed_from_the_api(api_url):
+    files = archive_file_list(
+        'https://github.com/owner/repository', ref='abc123', api_url=api_url
+    )
+    assert sorted(file.path for file in files) == ['a.py', 'pkg/b.py', 'pkg/sub/c.rs']
+
+
+def test_missing_repository_raises(api_url):
+    with pytest.raises(httpx.HTTPStatusError, match='404'):
+        list(archive_file_list('owner/missing', ref='abc123', api_url=api_url))
@@ -0,0 +1,97 @@
+import json
+import threading
+from base64 import b64encode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from github_trees import fetch_file_list
+
+BLOBS = {
+    'a': b'import os\n',
+    'b': b'def b():\n    pass\n',
+    'c': b'fn c() {}\n',
+    'r': b'# Read me',
+}
+
+
+def blob(path: str, sha: str) -> dict:
+    return {'path': path, 'type': 'blob', 'sha': sha, 'size': len(BLOBS[sha])}
+
+
+# The root tree is too large for one recursive listing, its pkg subtree is not
+TREES = {
+    'HEAD': [
+        blob('a.py', 'a'),
+        blob('README.md', 'r'),
+        {'path': 'pkg', 'type': 'tree', 'sha': 'pkg'},
+    ],
+    'pkg': [
+        blob('b.py', 'b'),
+        {'path': 'sub', 'type': 'tree', 'sha': 'sub'},
+        blob('sub/c.rs', 'c'),
+    ],
+}
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.requests.append(self.path)
+        _, _, owner, name, _, kind, sha = url.path.split('/')
+        if (owner, name) != ('owner', 'repository'):
+            return self.send_error(404)
+        if kind == 'trees':
+            recursive = parse_qs(url.query).get('recursive') == ['1']
+            body = {'sha': sha, 'tree': TREES[sha], 'truncated': recursive and sha == 'HEAD'}
+        else:
+            body = {
+                'sha': sha,
+                'content': b64encode(BLOBS[sha]).decode(),
+                'encoding': 'base64',
+            }
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeGitHub.requests = []
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_truncated_tree_is_listed_by_subtree(api_url):
+    files = fetch_file_list('owner/repository', api_url=api_url, include=lambda path: True)
+    assert sorted(file.path for file in files) == [
+        'README.md',
+        'a.py',
+        'pkg/b.py',
+        'pkg/sub/c.rs',
+    ]
+    assert '/repos/owner/repository/git/trees/HEAD' in FakeGitHub.requests
+    assert '/repos/owner/repository/git/trees/pkg?recursive=1' in FakeGitHub.requests
+
+
+def test_only_supported_blobs_are_downloaded(api_url):
+    files = fetch_file_list('owner/repository', api_url=api_url)
+    contents = {file.path: (file.sha, file.size, file.decoded_content) for file in files}
+    assert contents == {
+        'a.py': ('a', len(BLOBS['a']), BLOBS['a']),
+        'pkg/b.py': ('b', len(BLOBS['b']), BLOBS['b']),
+        'pkg/sub/c.rs': ('c', len(BLOBS['c']), BLOBS['c']),
+    }
+    assert '/repos/owner/repository/git/blobs/r' not in FakeGitHub.requests
@@ -0,0 +1,61 @@
+import networkx as nx
+
+from graph_clustering import EDGE_BYTES, NODE_BYTES, ClusterTree, cluster_id
+
+
+def call_graph(externals: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node('package.module.caller', filepath='package/module.py', content='def ...')
+    for i in range(externals):
+        graph.add_edge('package.module.caller', f'external_{i}')
+    return graph
+
+
+def test_expanding_a_cluster_keeps_to_the_node_budget():
+    tree = ClusterTree(call_graph(25))
+    external = cluster_id(('(external)',))
+    pages = [tree.expand(external, 10, offset) for offset in (0, 10, 20)]
+    assert [len(page['nodes']) for page in pages] == [10, 10, 5]
+    assert [page['more'] for page in pages] == [15, 5, 0]
+    sent = [node['id'] for page in pages for node in page['nodes']]
+    assert sorted(sent) == sorted(f'external_{i}' for i in range(25))
+    # Each page only has the edges of its own nodes
+    assert all(len(page['edges']) == len(page['nodes']) for page in pages)
+
+
+def test_unknown_cluster():
+    assert ClusterTree(call_graph(1)).expand('cluster:nope', 10) is None
+
+
+def test_size_counts_the_graph_and_function_source():
+    graph = call_graph(3)
+    assert ClusterTree(graph).size == 4 * NODE_BYTES + 3 * EDGE_BYTES + len('def ...')
+
+
+def package_graph(packages: int, modules: int, functions: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    for package in range(packages):
+        for module in range(modules):
+            for function in range(functions):
+                graph.add_node(
+                    f'package_{package}.module_{module}.f_{function}',
+                    filepath=f'package_{package}/module_{module}.py',
+                )
+    return graph
+
+
+def test_first_view_keeps_to_the_node_budget():
+    graph = package_graph(5, 10, 10)
+    tree = ClusterTree(graph)
+    for node_budget in (5, 20, 60, 499):
+        view = tree.level_of_detail(node_budget)
+        assert len(view) <= node_budget
+        # Every function is shown, on its own or inside a cluster of the view
+        assert all(tree.item_in(node, view) is not None for node in graph)
+    assert tree.level_of_detail(500) == set(graph)
+
+
+def test_top_level_clusters_are_shown_beyond_the_budget():
+    tree = ClusterTree(package_graph(8, 2, 2))
+    view = tree.level_of_detail(3)
+    assert view == {(f'package_{package}',) for package in range(8)}
@@ -0,0 +1,84 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from graphing import build_graphs_for_project, nodes_with_content, read_file_bytes
+
+MODULE = '''import os
+
+
+def outer():
+    """calls inner"""
+    return inner()
+
+
+def inner():
+    return os.getcwd()
+'''
+
+
+def test_nodes_with_content_reads_function_source_back(tmp_path):
+    (tmp_path / 'package').mkdir()
+    (tmp_path / 'package' / 'module.py').write_text(MODULE)
+    _, function_call_graph = build_graphs_for_project(
+        local_project_dir=tmp_path, parse_cache=None
+    )
+    read_files = []
+
+    def get_file_bytes(filepath):
+        read_files.append(filepath)
+        return read_file_bytes(filepath)
+
+    nodes_with_content(function_call_graph, get_file_bytes)
+    nodes = function_call_graph.nodes
+    assert nodes['package.module.outer']['content'] == (
+        'def outer():\n    """calls inner"""\n    return inner()'
+    )
+    assert nodes['package.module.inner']['content'] == 'def inner():\n    return os.getcwd()'
+    assert 'content' not in nodes['os.getcwd']
+    assert read_files == [str(tmp_path / 'package' / 'module.py')]
+
+
+def test_relative_imports_resolve_against_the_importing_package(tmp_path):
+    files = {
+        'pkg/__init__.py': '',
+        'pkg/a.py': 'from .b import f\nfrom . import c\nfrom .sub import d\n\n\n'
+        'def g():\n    return f()\n',
+        'pkg/b.py': 'def f():\n    pass\n',
+        'pkg/c.py': '',
+        'pkg/sub/__init__.py': 'def d():\n    pass\n',
+        'pkg/sub/e.py': 'from ..b import f\n',
+        'other/b.py': '',
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    file_level_graph, function_call_graph = build_graphs_for_project(
+        local_project_dir=tmp_path, parse_cache=None
+    )
+    # from . import c imports the package itself, then c from it
+    assert sorted(file_level_graph.successors('pkg/a.py')) == [
+        'pkg/__init__.py',
+        'pkg/b.py',
+        'pkg/c.py',
+        'pkg/sub/__init__.py',
+    ]
+    assert list(file_level_graph.successors('pkg/sub/e.py')) == ['pkg/b.py']
+    assert function_call_graph.has_edge('pkg.a.g', 'pkg.b.f')
+
+
+def test_files_are_parsed_in_a_shared_process_pool(tmp_path):
+    for number in range(8):
+        (tmp_path / f'module_{number}.py').write_text(
+            f'from module_{(number + 1) % 8} import f_{(number + 1) % 8}\n\n\n'
+            f'def f_{number}():\n    return f_{(number + 1) % 8}()\n'
+        )
+    graphs = build_graphs_for_project(local_project_dir=tmp_path)
+    executor = ProcessPoolExecutor(max_workers=2, mp_context=get_context('forkserver'))
+    # Analyses submit to the pool from the threads of the job queue
+    with executor, ThreadPoolExecutor(max_workers=2) as threads:
+        parallel_graphs = threads.submit(
+            build_graphs_for_project, local_project_dir=tmp_path, workers=2, executor=executor
+        ).result()
+    for graph, parallel_graph in zip(graphs, parallel_graphs):
+        assert list(parallel_graph.nodes(data=True)) == list(graph.nodes(data=True))
+        assert list(parallel_graph.edges) == list(graph.edges)
@@ -0,0 +1,117 @@
+import io
+import json
+import subprocess
+
+import pytest
+from git.repo import Repo
+
+from graphing import build_graphs_for_project
+from history_analysis import IncrementalProjectGraphs, graph_history, write_delta_stream
+
+# Every commit of the history below, each as the files it writes and the files it removes
+COMMITS = [
+    (
+        {
+            'pkg/__init__.py': '',
+            'pkg/a.py': 'from pkg.b import g\n\n\ndef f():\n    return g()\n',
+            'pkg/b.py': 'def g():\n    return 1\n',
+        },
+        [],
+    ),
+    (
+        {
+            'pkg/a.py': 'from pkg.b import g\n\n\ndef f():\n    return g()\n\n\ndef h():\n    return f()\n'
+        },
+        [],
+    ),
+    ({'c.py': 'from pkg.a import f\n\n\ndef k():\n    return f()\n'}, []),
+    ({}, ['pkg/a.py']),
+    ({'pkg/d.py': 'def g():\n    return 1\n'}, ['pkg/b.py']),
+    ({'pkg/e.py': 'from .d import g\n\n\ndef m():\n    return g()\n'}, []),
+]
+
+
+def git(*arguments, cwd):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *arguments],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repository(tmp_path):
+    git('init', '-q', '-b', 'main', cwd=tmp_path)
+    for number, (written_files, removed_files) in enumerate(COMMITS):
+        for path, content in written_files.items():
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text(content)
+        for path in removed_files:
+            (tmp_path / path).unlink()
+        git('add', '-A', '.', cwd=tmp_path)
+        git('commit', '-q', '-m', f'commit {number}', cwd=tmp_path)
+    return Repo(tmp_path)
+
+
+def fresh_graphs(commit, directory):
+    """the graphs of a commit built from scratch out of a checkout of its tree"""
+    for blob in commit.tree.traverse():
+        if blob.type == 'blob':
+            (directory / blob.path).parent.mkdir(parents=True, exist_ok=True)
+            (directory / blob.path).write_bytes(blob.data_stream.read())
+    return build_graphs_for_project(local_project_dir=directory)
+
+
+def graph_data(graph) -> tuple:
+    return (
+        set(graph.nodes),
+        set(graph.edges),
+        {node: attributes.get('span') for node, attributes in graph.nodes(data=True)},
+    )
+
+
+def test_every_commit_matches_a_fresh_build(repository, tmp_path_factory):
+    project_graphs = IncrementalProjectGraphs()
+    commits = list(repository.iter_commits('HEAD', reverse=True))
+    deltas = graph_history(repository, project_graphs=project_graphs)
+    for commit, delta in zip(commits, deltas, strict=True):
+        assert delta.commit == commit.hexsha
+        checkout = tmp_path_factory.mktemp('checkout')
+        file_level_graph, function_call_graph = fresh_graphs(commit, checkout)
+        assert graph_data(project_graphs.file_level_graph) == graph_data(file_level_graph)
+        assert graph_data(project_graphs.full_function_call_graph) == graph_data(
+            function_call_graph
+        )
+    assert len(commits) == len(COMMITS)
+
+
+def test_removed_definitions_leave_no_stale_attributes(repository):
+    project_graphs = IncrementalProjectGraphs()
+    for delta in graph_history(repository, 'HEAD~2', project_graphs=project_graphs):
+        pass
+    # pkg/a.py is removed, c.py still calls the function it defined
+    assert 'pkg/a.py' in delta.removed_files
+    assert project_graphs.full_function_call_graph.nodes['pkg.a.f'] == {}
+    assert 'pkg.a.h' not in project_graphs.full_function_call_graph
+
+
+def test_deltas_are_written_as_json_lines(repository):
+    stream = io.StringIO()
+    write_delta_stream(graph_history(repository), stream)
+    deltas = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(deltas) == len(COMMITS)
+    assert sorted(deltas[0]['added_files']) == ['pkg/__init__.py', 'pkg/a.py', 'pkg/b.py']
+    assert deltas[0]['added_calls'] == [['pkg.a.f', 'pkg.b.g']]
+    # Only the second function is new, empty fields are left out
+    assert deltas[1] == {
+        'commit': deltas[1]['commit'],
+        'added_functions': ['pkg.a.h'],
+        'added_calls': [['pkg.a.h', 'pkg.a.f']],
+    }
+    assert deltas[3]['removed_files'] == ['pkg/a.py']
+    assert ['c.py', 'pkg/a.py'] in deltas[3]['removed_file_edges']
+    # The rename removes one file and adds the other
+    assert deltas[4]['removed_files'] == ['pkg/b.py']
+    assert deltas[4]['added_files'] == ['pkg/d.py']
+    assert deltas[5]['added_file_edges'] == [['pkg/e.py', 'pkg/d.py']]
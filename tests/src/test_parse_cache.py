@@ -0,0 +1,101 @@
+import os
+import pickle
+from pathlib import Path
+
+import graphing
+import parse_cache as parse_cache_module
+from graphing import build_graphs_for_project
+from parse_cache import CACHE_DIRECTORY_VARIABLE, ParseCache
+
+
+def test_cache_directory_is_configurable(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIRECTORY_VARIABLE, str(tmp_path / 'caches'))
+    assert ParseCache().directory == tmp_path / 'caches' / 'parse_cache'
+    assert ParseCache(tmp_path / 'explicit').directory == tmp_path / 'explicit'
+
+
+def test_cache_directory_defaults_to_the_user_cache(tmp_path, monkeypatch):
+    monkeypatch.delenv(CACHE_DIRECTORY_VARIABLE, raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert ParseCache().directory == tmp_path / 'repo-review' / 'parse_cache'
+
+
+def test_graphs_are_only_cached_when_asked(tmp_path, monkeypatch):
+    project = tmp_path / 'project'
+    project.mkdir()
+    (project / 'module.py').write_text('def f():\n    return 1\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(CACHE_DIRECTORY_VARIABLE, str(tmp_path / 'caches'))
+    build_graphs_for_project(local_project_dir=project)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['project']
+
+    parse_cache = ParseCache()
+    build_graphs_for_project(local_project_dir=project, parse_cache=parse_cache)
+    assert len(parse_cache.entries()) == 1
+    assert Path(parse_cache.entries()[0].path).is_relative_to(tmp_path / 'caches')
+
+
+def graph_data(graph) -> tuple:
+    return sorted(graph.nodes(data=True)), sorted(graph.edges)
+
+
+def test_cached_files_are_not_parsed_again(tmp_path, monkeypatch):
+    project = tmp_path / 'project'
+    (project / 'package').mkdir(parents=True)
+    (project / 'package' / 'a.py').write_text(
+        'from b import g\n\n\ndef f():\n    return g()\n'
+    )
+    (project / 'package' / 'b.py').write_text('def g():\n    return 1\n')
+    parse_cache = ParseCache(tmp_path / 'cache')
+    graphs = build_graphs_for_project(local_project_dir=project, parse_cache=parse_cache)
+
+    def parse_file(*args, **kwargs):
+        raise AssertionError('a cached file was parsed again')
+
+    monkeypatch.setattr(graphing, 'parse_file', parse_file)
+    cached_graphs = build_graphs_for_project(
+        local_project_dir=project, parse_cache=parse_cache
+    )
+    for graph, cached_graph in zip(graphs, cached_graphs):
+        assert graph_data(cached_graph) == graph_data(graph)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    parse_cache = ParseCache(tmp_path, max_bytes=10_000)
+    for number in range(4):
+        parse_cache.put(f'{number:064x}', b'x' * 2000)
+        # Entries are ordered by modification time, one second apart
+        os.utime(parse_cache.entry_path(f'{number:064x}'), (number, number))
+    assert parse_cache.get(f'{0:064x}') == b'x' * 2000
+    parse_cache.put(f'{4:064x}', b'x' * 2000)
+    kept = [number for number in range(5) if parse_cache.get(f'{number:064x}') is not None]
+    assert kept == [0, 3, 4]
+    assert parse_cache.size <= 8000
+
+
+def test_entries_evicted_by_someone_else_are_misses(tmp_path, monkeypatch):
+    parse_cache = ParseCache(tmp_path)
+    parse_cache.put('ab' * 32, {'parsed': True})
+    load = pickle.load
+
+    def load_then_evict(file):
+        # Another process evicts the entry between reading it and marking it as used
+        parsed_file = load(file)
+        os.remove(parse_cache.entry_path('ab' * 32))
+        return parsed_file
+
+    monkeypatch.setattr(parse_cache_module.pickle, 'load', load_then_evict)
+    assert parse_cache.get('ab' * 32) == {'parsed': True}
+    monkeypatch.setattr(parse_cache_module.pickle, 'load', load)
+    assert parse_cache.get('ab' * 32) is None
+    parse_cache.put('ab' * 32, {'parsed': False})
+    parse_cache.evict()
+
+
+def test_entries_of_stale_classes_are_misses(tmp_path):
+    parse_cache = ParseCache(tmp_path)
+    entry_path = parse_cache.entry_path('cd' * 32)
+    entry_path.parent.mkdir(parents=True)
+    # A pickle of a class the parse cache module no longer has
+    entry_path.write_bytes(pickle.dumps(ParseCache).replace(b'ParseCache', b'ParseCachX'))
+    assert parse_cache.get('cd' * 32) is None
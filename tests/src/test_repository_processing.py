@@ -0,0 +1,143 @@
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+from git.repo import Repo
+
+from repository_processing import get_repo, read_blobs, repo_file_list, traverse_tree
+
+
+def git(*arguments, cwd):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *arguments],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def make_repository(path, files: dict[str, str]) -> Repo:
+    path.mkdir()
+    git('init', '-q', '-b', 'main', cwd=path)
+    for name, content in files.items():
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text(content)
+    git('add', '.', cwd=path)
+    git('commit', '-q', '-m', 'files', cwd=path)
+    return Repo(path)
+
+
+def finishes(function, timeout: float = 20) -> bool:
+    thread = threading.Thread(target=function, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+@pytest.fixture
+def large_repository(tmp_path):
+    # More output than a pipe holds, so git blocks writing when nobody reads it
+    files = {f'package/module_{i}.py': 'x = 1\n' for i in range(2000)}
+    files.update({f'large_{i}.py': 'y = 2\n' * 20_000 for i in range(4)})
+    return make_repository(tmp_path / 'repository', files)
+
+
+def test_closing_file_list_early_stops_git(large_repository):
+    def read_one_file():
+        files = repo_file_list(large_repository)
+        next(files)
+        files.close()
+
+    assert finishes(read_one_file)
+
+
+def test_closing_tree_traversal_early_stops_git(large_repository):
+    def read_one_entry():
+        entries = traverse_tree(large_repository.head.commit.tree)
+        next(entries)
+        entries.close()
+
+    assert finishes(read_one_entry)
+
+
+def test_reads_every_supported_file(large_repository):
+    entries = list(traverse_tree(large_repository.head.commit.tree))
+    files = list(read_blobs(large_repository, entries))
+    assert len(files) == len(entries) == 2004
+    assert files[0].content == b'y = 2\n' * 20_000
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """a bare repository served over file:// with a python file, a text file and history"""
+    work = make_repository(tmp_path / 'work', {'first.py': 'x = 1\n', 'notes.txt': 'text\n'})
+    (tmp_path / 'work' / 'second.py').write_text('y = 2\n')
+    git('add', '.', cwd=tmp_path / 'work')
+    git('commit', '-q', '-m', 'second', cwd=tmp_path / 'work')
+    git(
+        'clone',
+        '-q',
+        '--bare',
+        str(tmp_path / 'work'),
+        str(tmp_path / 'remote.git'),
+        cwd=tmp_path,
+    )
+    # Partial clones need the serving side to allow filters
+    git('config', 'uploadpack.allowFilter', 'true', cwd=tmp_path / 'remote.git')
+    git('remote', 'add', 'origin', str(tmp_path / 'remote.git'), cwd=tmp_path / 'work')
+    return work, f'file://{tmp_path / "remote.git"}'
+
+
+def push_commit(work: Repo, name: str, content: str) -> str:
+    path = Path(work.working_dir)
+    (path / name).write_text(content)
+    git('add', '.', cwd=path)
+    git('commit', '-q', '-m', name, cwd=path)
+    git('push', '-q', 'origin', 'main', cwd=path)
+    return work.head.commit.hexsha
+
+
+def test_single_mode_is_shallow_blobless_and_sparse(remote, tmp_path, monkeypatch):
+    work, url = remote
+    monkeypatch.chdir(tmp_path)
+    repo = get_repo(url)
+    assert repo.git.rev_parse('--is-shallow-repository') == 'true'
+    assert len(list(repo.iter_commits())) == 1
+    assert (
+        repo.config_reader().get_value('remote "origin"', 'partialclonefilter') == 'blob:none'
+    )
+    checked_out = sorted(path.name for path in Path(repo.working_dir).iterdir())
+    assert checked_out == ['.git', 'first.py', 'second.py']
+
+
+def test_single_mode_fetches_new_commits(remote, tmp_path, monkeypatch):
+    work, url = remote
+    monkeypatch.chdir(tmp_path)
+    get_repo(url)
+    head = push_commit(work, 'third.py', 'z = 3\n')
+    repo = get_repo(url)
+    assert repo.head.commit.hexsha == head
+    assert len(list(repo.iter_commits())) == 1
+    assert (Path(repo.working_dir) / 'third.py').read_text() == 'z = 3\n'
+    assert sorted(file.path for file in repo_file_list(repo)) == [
+        '/first.py',
+        '/second.py',
+        '/third.py',
+    ]
+    # Listing the files must not fetch blobs the sparse checkout left out
+    notes = work.head.commit.tree['notes.txt'].hexsha
+    missing = repo.git.rev_list('--objects', '--missing=print', 'HEAD').split()
+    assert f'?{notes}' in missing
+
+
+def test_history_mode_has_every_commit_and_no_checkout(remote, tmp_path, monkeypatch):
+    work, url = remote
+    monkeypatch.chdir(tmp_path)
+    repo = get_repo(url, mode='history')
+    assert len(list(repo.iter_commits())) == 2
+    assert sorted(path.name for path in Path(repo.working_dir).iterdir()) == ['.git']
+    head = push_commit(work, 'third.py', 'z = 3\n')
+    repo = get_repo(url, mode='history')
+    assert repo.head.commit.hexsha == head
+    assert len(list(repo.iter_commits())) == 3
@@ -0,0 +1,51 @@
+import json
+
+import networkx as nx
+
+from vis_payload import VIS_OPTIONS, node_details, vis_data, vis_parameters
+
+
+def reviewed_graph() -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_node(
+        'a.py',
+        title='a.py',
+        color='red',
+        size=20,
+        content='def f():\n    return 1\n',
+        responses=['Fine.'],
+    )
+    graph.add_node('b.py', label='b', code='def g():\n    return 2\n')
+    graph.add_edge('a.py', 'b.py', weight=3)
+    graph.add_edge('b.py', 'a.py')
+    return graph
+
+
+def test_heavy_fields_stay_out_of_the_nodes():
+    data = vis_data(reviewed_graph())
+    assert data['nodes'] == [
+        {'id': 'a.py', 'label': 'a.py', 'title': 'a.py', 'color': 'red', 'size': 20},
+        {'id': 'b.py', 'label': 'b'},
+    ]
+
+
+def test_node_details_hold_what_the_nodes_leave_out():
+    assert node_details(reviewed_graph()) == {
+        'a.py': {'content': 'def f():\n    return 1\n', 'responses': ['Fine.']},
+        'b.py': {'code': 'def g():\n    return 2\n'},
+    }
+
+
+def test_edge_weights_become_widths():
+    assert vis_data(reviewed_graph())['edges'] == [
+        {'from': 'a.py', 'to': 'b.py', 'width': 3},
+        {'from': 'b.py', 'to': 'a.py'},
+    ]
+
+
+def test_parameters_are_json_strings():
+    graph = reviewed_graph()
+    data, options = vis_parameters(graph)
+    assert json.loads(data) == vis_data(graph)
+    assert json.loads(options) == VIS_OPTIONS
+    assert 'return 1' not in data